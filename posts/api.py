@@ -0,0 +1,221 @@
+"""JSON API для чтения лент, групп, профилей и постов (/api/v1/).
+
+Повторяет страницы index, follow_index, group_posts, profile и
+post_view с теми же правами: ленту подписок видит только вошедший
+пользователь, остальное доступно всем. Списки листаются курсором
+(?after=, ?before=, ссылки next и previous), ?fields=id,text
+оставляет в постах только перечисленные поля, ETag и Last-Modified
+считаются так же, как у HTML-страниц (conditional.py).
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from . import thumbnails, timeline
+from .conditional import conditional_page, follow_feed
+from .models import Group, Post, User, UserStats
+from .paginator import get_page
+
+COMMENT_ORDERING = ('-created', '-id')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def absolute_srcset(request, srcset):
+    return ', '.join(
+        f'{request.build_absolute_uri(url)} {width}'
+        for url, width in (item.rsplit(' ', 1)
+                           for item in srcset.split(', ') if item))
+
+
+def image_field(request, post):
+    if not post.image:
+        return None
+    picture = thumbnails.picture(post.image, settings.API_POST_THUMBNAIL)
+    return {
+        'original': request.build_absolute_uri(post.image.url),
+        'src': request.build_absolute_uri(picture['src']),
+        'srcset': absolute_srcset(request, picture['srcset']),
+        'sources': [{'type': source['type'],
+                     'srcset': absolute_srcset(request, source['srcset'])}
+                    for source in picture['sources']],
+    }
+
+
+POST_FIELDS = {
+    'id': lambda request, post: post.id,
+    'text': lambda request, post: post.text,
+    'pub_date': lambda request, post: post.pub_date.isoformat(),
+    'author': lambda request, post: post.author.username,
+    'group': lambda request, post: post.group and post.group.slug,
+    'comments_count': lambda request, post: post.comments_count,
+    'image': image_field,
+}
+
+
+def post_fields(request):
+    """Поля постов из ?fields=; по умолчанию все."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = set(fields) - set(POST_FIELDS)
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return fields
+
+
+def serialize_posts(request, posts):
+    fields = post_fields(request)
+    if 'image' in fields:
+        thumbnails.prefetch([post.image.name for post in posts if post.image],
+                            [settings.API_POST_THUMBNAIL])
+    return [{name: POST_FIELDS[name](request, post) for name in fields}
+            for post in posts]
+
+
+def serialize_comment(comment):
+    return {'id': comment.id,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+            'author': comment.author.username}
+
+
+def serialize_author(author):
+    try:
+        stats = author.stats
+    except UserStats.DoesNotExist:
+        # Строки нет у пользователей, созданных в обход сигналов.
+        stats = UserStats(user=author)
+    return {'username': author.username,
+            'full_name': author.get_full_name(),
+            'posts_count': stats.posts_count,
+            'followers_count': stats.followers_count,
+            'following_count': stats.following_count}
+
+
+def page_links(request, page):
+    """Адреса соседних страниц с теми же параметрами запроса."""
+    links = {}
+    for name, key, cursor in (('next', 'after', page.next_cursor),
+                              ('previous', 'before', page.previous_cursor)):
+        if cursor is None:
+            links[name] = None
+            continue
+        query = request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[key] = cursor
+        links[name] = request.build_absolute_uri(
+            f'{request.path}?{query.urlencode()}')
+    return links
+
+
+def posts_page(request, queryset):
+    page = get_page(request, queryset, cursor=True)
+    return {'results': serialize_posts(request, page.object_list),
+            **page_links(request, page)}
+
+
+def is_following(request, author):
+    if not request.user.is_authenticated or author == request.user:
+        return False
+    return author.following.filter(user=request.user).exists()
+
+
+def api_view(view):
+    """Ответы JSON для GET и HEAD, ошибки тоже в JSON."""
+
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено'}, status=404)
+        except BadRequest as error:
+            return JsonResponse({'detail': str(error)}, status=400)
+        if isinstance(data, JsonResponse):
+            return data
+        return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+    return wrapper
+
+
+@conditional_page(lambda: ['posts'])
+@api_view
+def posts(request):
+    return posts_page(request, Post.objects.for_feed())
+
+
+def followed_authors(request):
+    """Подмешиваемые авторы из подписок, один запрос на ответ."""
+    if not hasattr(request, '_followed_authors'):
+        request._followed_authors, request._feed_version = follow_feed(
+            request.user)
+    return request._followed_authors
+
+
+def follow_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    followed_authors(request)
+    version = request._feed_version
+    raw = f'{request.get_full_path()}|{request.user.username}|{version!r}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+@condition(etag_func=follow_etag)
+@api_view
+def follow(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужно войти'}, status=401)
+    page = timeline.follow_page(request, request.user,
+                                followed_authors(request), cursor=True)
+    return {'results': serialize_posts(request, page.object_list),
+            **page_links(request, page)}
+
+
+@conditional_page(lambda slug: [f'group:{slug}'])
+@api_view
+def group(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return {'group': {'slug': group.slug,
+                      'title': group.title,
+                      'description': group.description},
+            **posts_page(request, group.posts.for_feed())}
+
+
+@conditional_page(lambda username: [f'profile:{username}'])
+@api_view
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    return {'author': serialize_author(author),
+            'is_following': is_following(request, author),
+            **posts_page(request, author.posts.for_feed())}
+
+
+@conditional_page(
+    lambda username, post_id: [f'post:{post_id}', f'profile:{username}'])
+@api_view
+def post(request, username, post_id):
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'),
+        author__username=username,
+        id=post_id,
+    )
+    comments = get_page(request, post.comments.select_related('author'),
+                        ordering=COMMENT_ORDERING, cursor=True)
+    return {'post': serialize_posts(request, [post])[0],
+            'author': serialize_author(post.author),
+            'is_following': is_following(request, post.author),
+            'comments': [serialize_comment(comment)
+                         for comment in comments.object_list],
+            **page_links(request, comments)}
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path("posts/", api.posts, name="api_posts"),
+    path("follow/", api.follow, name="api_follow"),
+    path("groups/<slug:slug>/", api.group, name="api_group"),
+    path("users/<str:username>/", api.profile, name="api_profile"),
+    path("users/<str:username>/posts/<int:post_id>/",
+         api.post,
+         name="api_post"),
+]
@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_index(sender, using, **kwargs):
+    from django.db import connections
+
+    from . import search
+
+    if search.available(connections[using]):
+        search.create_index(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from yatube import replica
+
+        from . import signals  # noqa
+        post_migrate.connect(create_search_index, sender=self)
+        # Реплика копируется после индекса, чтобы получить и его.
+        post_migrate.connect(replica.sync_after_migrate, sender=self)
@@ -0,0 +1,81 @@
+"""Помощники для массовой загрузки данных через bulk_create.
+
+bulk_create не отправляет сигналы моделей, поэтому после загрузки
+производные данные (счётчики, ленты подписок) пересобираются
+функцией rebuild_derived().
+"""
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import stats, timeline
+from .models import Comment, Post, User
+
+AUTO_DATE_FIELDS = ((Post, 'pub_date'), (Comment, 'created'))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def explicit_dates():
+    """Позволяет bulk_create сохранить заданные pub_date/created."""
+    fields = [model._meta.get_field(name) for model, name in AUTO_DATE_FIELDS]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def bulk_insert(model, objects, chunk_size, ignore_conflicts=False):
+    """Вставляет объекты пачками, каждая пачка в своей транзакции."""
+    total = 0
+    with explicit_dates():
+        for chunk in chunked(objects, chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    chunk, ignore_conflicts=ignore_conflicts)
+            total += len(chunk)
+    return total
+
+
+def in_batch_size(batch_size, lists=1):
+    """Размер пачки для lists IN-списков одного запроса: вместе они
+    не превышают предела параметров запроса."""
+    limit = connection.features.max_query_params
+    return min(batch_size, limit // lists) if limit else batch_size
+
+
+def id_batches(queryset, batch_size):
+    batch_size = in_batch_size(batch_size)
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id')
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def rebuild_derived(batch_size, timelines=True):
+    """Пересчитывает счётчики и ленты подписок после массовой загрузки."""
+    for ids in id_batches(User.objects.all(), batch_size):
+        stats.recount_users(ids)
+        if timelines:
+            for user in User.objects.filter(id__in=ids):
+                timeline.rebuild(user)
+    for ids in id_batches(Post.objects.all(), batch_size):
+        stats.recount_posts(ids)
+    cache.clear()
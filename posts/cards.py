@@ -0,0 +1,137 @@
+"""Быстрая отрисовка карточки записи (includes/incl_post_block.html).
+
+Шаблон карточки на каждую запись выполняет три {% url %}, тег
+post_picture и фильтр linebreaksbr. PostCards разворачивает адреса
+профиля, записи и правки один раз на страницу в образцы для
+str.format и собирает карточку из полей записи строковыми операциями.
+
+Результат совпадает с {% include "includes/incl_post_block.html" %}
+символ в символ: при правке шаблона карточки нужно поправить и CARD,
+расхождение ловит posts/tests/test_cards.py.
+"""
+from urllib.parse import quote
+
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils import formats
+from django.utils.html import escape
+from django.utils.http import RFC3986_SUBDELIMS
+from django.utils.safestring import mark_safe
+from django.utils.timezone import template_localtime
+
+from . import thumbnails
+
+# Значения-метки, которые reverse() кодирует предсказуемо.
+USERNAME_MARKER = '\x00'
+POST_ID_MARKER = 4294967291
+
+# Так reverse() кодирует аргументы адреса.
+URL_SAFE = RFC3986_SUBDELIMS + '/~:@'
+
+CARD_GEOMETRY = '960x339'
+CARD_SIZES = '(min-width: 1200px) 825px, (min-width: 768px) 75vw, 100vw'
+
+CARD = (
+    '\n<div class="card mb-3 mt-1 shadow-sm">\n'
+    '    {picture}    \n'
+    '    <div class="card-body">\n'
+    '            <p class="card-text">\n'
+    '                    <!-- Ссылка на страницу автора в атрибуте href; '
+    'username автора в тексте ссылки -->\n'
+    '                    <a href="{profile}"><strong class="d-block '
+    'text-gray-dark">@{author}</strong></a>\n'
+    '                    <!-- Текст поста -->\n'
+    '                    <p> {text}</p> \n'
+    '            </p>\n'
+    '            <div class="d-flex justify-content-between '
+    'align-items-center">\n'
+    '                <div class="btn-group ">\n'
+    '                    <div class="btn btn-sm text-muted">Комментариев: '
+    '{comments}</div>\n'
+    '                    \n'
+    '                    <!-- Ссылка на страницу записи в атрибуте href--> \n'
+    '                    <a class="btn btn-sm text-muted" href="{post}" '
+    'role="button">Добавить комментарий</a>'
+    '                        \n'
+    '                    {edit}\n'
+    '                </div>   \n'
+    '                    <!-- Дата публикации  -->\n'
+    '                    <small class="text-muted">{pub_date}</small>\n'
+    '            </div>\n'
+    '    </div>\n'
+    '</div>'
+)
+EDIT = (
+    '\n                       <a class="btn btn-sm text-muted" href="{}" '
+    'role="button" >Редактировать </a>     \n                    '
+)
+PICTURE_SOURCE = '<source srcset="{}" sizes="{}" type="{}">\n  '
+
+
+def url_pattern(name, **kwargs):
+    """Образец адреса name для str.format с полями username и post_id."""
+    return (reverse(name, kwargs=kwargs)
+            .replace(quote(USERNAME_MARKER, safe=URL_SAFE), '{username}')
+            .replace(str(POST_ID_MARKER), '{post_id}'))
+
+
+def picture_html(picture, sizes):
+    """То же, что тег post_picture с шаблоном includes/picture.html."""
+    if not picture.get('src'):
+        return '\n'
+    sizes = escape(sizes)
+    sources = ''.join(
+        PICTURE_SOURCE.format(escape(source['srcset']), sizes,
+                              escape(source['type']))
+        for source in picture['sources'])
+    srcset = (f' srcset="{escape(picture["srcset"])}" sizes="{sizes}"'
+              if picture['srcset'] else '')
+    return (f'<picture>\n  {sources}<img class="card-img" '
+            f'src="{escape(picture["src"])}"{srcset}>\n</picture>\n')
+
+
+class PostCards:
+    """Карточки записей одной страницы для пользователя user."""
+
+    def __init__(self, user=None, use_tz=None, use_l10n=None):
+        self.user_id = user.pk if user is not None else None
+        self.use_tz = use_tz
+        self.use_l10n = use_l10n
+        self.profile = url_pattern('profile', username=USERNAME_MARKER)
+        self.post = url_pattern('post', username=USERNAME_MARKER,
+                                post_id=POST_ID_MARKER)
+        self.edit = url_pattern('post_edit', username=USERNAME_MARKER,
+                                post_id=POST_ID_MARKER)
+        self.usernames = {}
+
+    def username(self, username):
+        """Имя автора в адресе, закодированное и экранированное."""
+        quoted = self.usernames.get(username)
+        if quoted is None:
+            quoted = self.usernames[username] = escape(
+                quote(username, safe=URL_SAFE))
+        return quoted
+
+    def render(self, post):
+        author = post.author
+        username = self.username(author.username)
+        edit = ''
+        if self.user_id is not None and post.author_id == self.user_id:
+            edit = EDIT.format(self.edit.format(username=username,
+                                                post_id=post.id))
+        pub_date = post.pub_date
+        if pub_date is not None:
+            pub_date = formats.date_format(
+                template_localtime(pub_date, self.use_tz), 'd M Y h:i')
+        return mark_safe(CARD.format(
+            picture=picture_html(
+                thumbnails.picture(post.image, CARD_GEOMETRY), CARD_SIZES),
+            profile=self.profile.format(username=username),
+            author=escape(author),
+            text=linebreaksbr(post.text, autoescape=True),
+            comments=escape(formats.localize(post.comments_count,
+                                             use_l10n=self.use_l10n)),
+            post=self.post.format(username=username, post_id=post.id),
+            edit=edit,
+            pub_date=pub_date or '',
+        ))
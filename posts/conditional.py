@@ -0,0 +1,120 @@
+"""ETag и Last-Modified для страниц лент и постов.
+
+Валидаторы собираются только из версий в кэше (см. versions.py):
+ответ 304 отдаётся без запросов страницы к базе и без шаблона.
+Версия области равна времени последней записи, которая могла
+изменить страницу: новой публикации, комментария, подписки.
+
+В ETag страниц с формами входит CSRF-токен из cookie: после нового
+входа браузер не получит 304 и не отправит форму со старым токеном.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from yatube import replica
+
+from . import timeline, versions
+from .models import Group, Post
+
+
+def touch_post(post, *group_ids):
+    slugs = Group.objects.filter(
+        id__in=[group_id for group_id in group_ids if group_id]
+    ).values_list('slug', flat=True)
+    versions.bump('posts', f'post:{post.id}',
+                  f'profile:{post.author.username}',
+                  *(f'group:{slug}' for slug in slugs))
+
+
+def touch_comment(comment):
+    """Комментарий меняет comments_count поста во всех лентах с ним:
+    общей, группы, профиля и подписок."""
+    post = (Post.objects.select_related('author')
+            .filter(id=comment.post_id).first())
+    if post is None:
+        return
+    touch_post(post, post.group_id)
+    timeline.touch_followers(post.author_id)
+
+
+def touch_profiles(*users):
+    versions.bump(*(f'profile:{user.username}' for user in users))
+
+
+def follow_feed(user):
+    """Авторы из подписок, подмешиваемые при чтении
+    (timeline.followed_authors), и версия ленты подписок. Чтения
+    запроса уходят в основную базу, если реплика старше ленты: сначала
+    по версии подписок пользователя, затем по версии всей ленты."""
+    key = f'feed:{user.pk}'
+    replica.require_synced(versions.get_versions(key)[key])
+    authors = timeline.followed_authors(user)
+    version = timeline.feed_version(user, authors.celebrities)
+    replica.require_synced(version)
+    return authors, version
+
+
+def _validators(request, scopes, csrf=False):
+    cached = getattr(request, '_page_validators', None)
+    if cached is not None:
+        return cached
+    viewer = request.user.username if request.user.is_authenticated else ''
+    names = list(scopes)
+    if viewer:
+        names.append(f'profile:{viewer}')
+    found = versions.get_versions(*names)
+    replica.require_synced(max(found.values()))
+    token = request.META.get('CSRF_COOKIE', '') if csrf else ''
+    raw = '|'.join([request.get_full_path(), viewer, token]
+                   + [f'{name}={found[name]!r}' for name in names])
+    request._page_validators = (
+        hashlib.md5(raw.encode()).hexdigest(),
+        datetime.fromtimestamp(max(found.values()), tz=timezone.utc),
+    )
+    return request._page_validators
+
+
+def conditional_page(scopes, csrf=False):
+    """Декоратор страницы; scopes(**kwargs) — области, от которых
+    зависит страница, csrf — страница выводит форму с CSRF-токеном."""
+
+    def etag(request, *args, **kwargs):
+        return _validators(request, scopes(**kwargs), csrf)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return _validators(request, scopes(**kwargs), csrf)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def cached_page(scopes, timeout):
+    """conditional_page, ответ которого хранится в кэше под своим ETag.
+
+    Новая версия области даёт новый ключ, старые записи истекают сами:
+    при неизменных данных ответ 200 тоже обходится без базы.
+    """
+
+    def decorator(view):
+        @conditional_page(scopes)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = _validators(request, scopes(**kwargs))[0]
+            key = f'page:{etag}'
+            cached = cache.get(key)
+            if cached is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cached = (response.content, response['Content-Type'])
+                cache.set(key, cached, timeout)
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,103 @@
+"""Ленты RSS и Atom для главной страницы, групп и авторов.
+
+Готовые ленты лежат в кэше под своим ETag (conditional.cached_page):
+новая запись меняет версию области, и следующий запрос собирает ленту
+заново. Пока данные не менялись, повторные опросы получают 304 или
+ответ из кэша без запросов к базе.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .conditional import cached_page
+from .models import Group, Post, User
+
+
+class PostFeed(Feed):
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(60)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('post', kwargs={'username': post.author.username,
+                                       'post_id': post.id})
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_author_link(self, post):
+        return reverse('profile', kwargs={'username': post.author.username})
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class IndexFeed(PostFeed):
+    title = 'Yatube: последние обновления'
+    description = 'Новые записи на сайте'
+
+    def link(self):
+        return reverse('index')
+
+    def items(self):
+        return Post.objects.for_feed()[:settings.FEED_ITEMS]
+
+
+class GroupFeed(PostFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('group', kwargs={'slug': group.slug})
+
+    def items(self, group):
+        return group.posts.for_feed()[:settings.FEED_ITEMS]
+
+
+class ProfileFeed(PostFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: записи {author.username}'
+
+    def description(self, author):
+        return f'Новые записи автора {author.username}'
+
+    def link(self, author):
+        return reverse('profile', kwargs={'username': author.username})
+
+    def items(self, author):
+        return author.posts.for_feed()[:settings.FEED_ITEMS]
+
+
+def feed_views(feed_class, scopes):
+    """Представления RSS и Atom для ленты feed_class."""
+    atom_class = type(f'{feed_class.__name__}Atom', (feed_class,),
+                      {'feed_type': Atom1Feed})
+    cached = cached_page(scopes, settings.FEED_CACHE_TIMEOUT)
+    return cached(feed_class()), cached(atom_class())
+
+
+index_rss, index_atom = feed_views(IndexFeed, lambda: ['posts'])
+group_rss, group_atom = feed_views(
+    GroupFeed, lambda slug: [f'group:{slug}'])
+profile_rss, profile_atom = feed_views(
+    ProfileFeed, lambda username: [f'profile:{username}'])
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import validate_upload
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,12 @@ class PostForm(forms.ModelForm):
         super(PostForm, self).__init__(*args, **kwargs)
         self.fields['group'].empty_label = '-без группы-'
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            validate_upload(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
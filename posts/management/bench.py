@@ -0,0 +1,56 @@
+"""Общее для команд bench_*: вывод отчёта, перцентили и подсчёт
+запросов к базам."""
+import json
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(share * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@contextmanager
+def capture_queries():
+    """Число запросов ко всем базам из DATABASES: чтения лент идут и в
+    реплику.
+
+    В отличие от CaptureQueriesContext соединения не открываются
+    (соединение с файлом реплики создало бы пустую базу), а журналы
+    очищаются заранее: request_started всё равно очищает их посреди
+    замера.
+    """
+    wrappers = [connections[alias] for alias in connections]
+    forced = [wrapper.force_debug_cursor for wrapper in wrappers]
+    captured = []
+    for wrapper in wrappers:
+        wrapper.force_debug_cursor = True
+        wrapper.queries_log.clear()
+    try:
+        yield captured
+    finally:
+        for wrapper, force in zip(wrappers, forced):
+            wrapper.force_debug_cursor = force
+            captured.append(len(wrapper.queries_log))
+
+
+class BenchCommand(BaseCommand):
+    """Команда-бенчмарк: report() собирает отчёт, а handle() выводит его
+    в JSON и пишет в файл --output."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        output = json.dumps(self.report(options), indent=2,
+                            ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def report(self, options):
+        raise NotImplementedError
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import CommandError
+from django.template import engines
+
+from posts.management.bench import BenchCommand, percentile
+from posts.models import Post, User
+
+# Тот же цикл по странице, что в profile.html, без остальной разметки.
+PAGES = {
+    'include': ('{% for post in page %}'
+                '{% include "includes/incl_post_block.html" with post=post %}'
+                '{% endfor %}'),
+    'post_card': ('{% load post_cards %}'
+                  '{% for post in page %}{% post_card post %}{% endfor %}'),
+}
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает отрисовку карточек записей шаблоном '
+            'incl_post_block.html и тегом post_card; результат выводится '
+            'в JSON')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--rounds', type=int, default=500,
+                            help='Отрисовок страницы каждым способом')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10,
+                            help='Записей на странице')
+
+    def report(self, options):
+        author = User.objects.order_by('-stats__posts_count').first()
+        page = list(Post.objects.filter(author=author)
+                    .select_related('author')[:options['posts']])
+        if not page:
+            raise CommandError('В базе нет данных, запустите generate_data')
+        engine = engines['django']
+        context = {'page': page, 'user': author}
+        outputs = {}
+        report = {'author': author.username, 'posts': len(page),
+                  'renderers': {}}
+        for name, source in PAGES.items():
+            template = engine.from_string(source)
+            for _ in range(options['warmup']):
+                template.render(context)
+            latencies = []
+            for _ in range(options['rounds']):
+                begin = time.perf_counter()
+                outputs[name] = template.render(context)
+                latencies.append((time.perf_counter() - begin) * 1000)
+            report['renderers'][name] = {
+                'p50_ms': round(percentile(latencies, 0.50), 4),
+                'p95_ms': round(percentile(latencies, 0.95), 4),
+                'per_card_us': round(
+                    percentile(latencies, 0.50) * 1000 / len(page), 2),
+            }
+        report['identical'] = outputs['include'] == outputs['post_card']
+        report['speedup_p50'] = round(
+            report['renderers']['include']['p50_ms']
+            / report['renderers']['post_card']['p50_ms'], 2)
+
+        return report
@@ -0,0 +1,158 @@
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from posts import writes
+from posts.management.bench import BenchCommand, percentile
+from posts.models import Comment, Post, User
+from yatube.workers import process_pool
+
+BENCH_TEXT = 'bench_concurrency'
+
+# Настройки соединения до профиля yatube/sqlite: журнал DELETE,
+# ожидание блокировки по умолчанию, новое соединение на каждый запрос.
+PROFILES = {
+    'stock': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pragmas': {'journal_mode': 'DELETE',
+                                'synchronous': 'FULL',
+                                'busy_timeout': 5000,
+                                'cache_size': -2000,
+                                'mmap_size': 0,
+                                'temp_store': 'DEFAULT'},
+                    'transaction_mode': None},
+    },
+    'tuned': {},
+}
+
+
+def run_client(profile, seed, start_at, duration, write_share):
+    """Один клиент в отдельном процессе: смесь чтений и записей."""
+    settings.DATABASES['default'].update(PROFILES[profile])
+    connections['default'].close()
+    rnd = random.Random(seed)
+    users = list(User.objects.order_by('id').values_list('id', flat=True)
+                 [:100])
+    posts = list(Post.objects.order_by('-id')
+                 .values_list('author__username', 'id')[:100])
+    client = Client(REMOTE_ADDR='10.0.0.1')
+    client.force_login(User.objects.get(id=rnd.choice(users)))
+    reads = [reverse('index'), reverse('follow_index')] + [
+        reverse('post', kwargs={'username': username, 'post_id': post_id})
+        for username, post_id in posts[:20]]
+
+    latencies = {'read': [], 'write': []}
+    errors = locked = 0
+    time.sleep(max(0, start_at - time.time()))
+    writes.reset_metrics()
+    while time.time() < start_at + duration:
+        kind = 'write' if rnd.random() < write_share else 'read'
+        begin = time.perf_counter()
+        try:
+            if kind == 'read':
+                response = client.get(rnd.choice(reads))
+            elif rnd.random() < 0.5:
+                response = client.post(reverse('new_post'),
+                                       {'text': BENCH_TEXT})
+            else:
+                username, post_id = rnd.choice(posts)
+                response = client.post(
+                    reverse('add_comment', kwargs={'username': username,
+                                                   'post_id': post_id}),
+                    {'text': BENCH_TEXT})
+        except Exception as error:
+            errors += 1
+            locked += 'locked' in str(error)
+            continue
+        if response.status_code >= 400:
+            errors += 1
+            continue
+        latencies[kind].append((time.perf_counter() - begin) * 1000)
+    connections.close_all()
+    return latencies, errors, locked, writes.metrics()
+
+
+class Command(BenchCommand):
+    help = ('Замеряет пропускную способность при одновременных чтениях '
+            'и записях (new_post, add_comment) в нескольких процессах '
+            'для профилей соединения stock и tuned, с метриками '
+            'ожидания блокировки; результат в JSON')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Процессов-клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд на профиль')
+        parser.add_argument('--write-share', type=float, default=0.2,
+                            help='Доля записей среди запросов')
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                            default=list(PROFILES))
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные записи')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def report(self, options):
+        if not Post.objects.exists():
+            raise CommandError('В базе нет данных, запустите generate_data')
+        report = {'workers': options['workers'],
+                  'duration_s': options['duration'],
+                  'write_share': options['write_share'],
+                  'profiles': {}}
+        # Процессы-клиенты открывают свои соединения, и журнал можно
+        # переключить, только когда база никем не занята.
+        connections.close_all()
+        try:
+            for profile in options['profiles']:
+                report['profiles'][profile] = self.measure(profile, options)
+        finally:
+            if not options['keep']:
+                Comment.objects.filter(text=BENCH_TEXT).delete()
+                Post.objects.filter(text=BENCH_TEXT).delete()
+        measured = report['profiles']
+        if {'stock', 'tuned'} <= set(measured):
+            report['throughput_ratio'] = round(
+                measured['tuned']['throughput_rps']
+                / max(measured['stock']['throughput_rps'], 0.01), 2)
+        return report
+
+    def measure(self, profile, options):
+        workers = options['workers']
+        # Время на запуск процессов и django.setup() в каждом из них.
+        start_at = time.time() + 2 + workers * 0.5
+        with process_pool(workers) as pool:
+            results = list(pool.map(
+                run_client, [profile] * workers,
+                range(options['seed'], options['seed'] + workers),
+                [start_at] * workers, [options['duration']] * workers,
+                [options['write_share']] * workers))
+        latencies = {'read': [], 'write': []}
+        errors = locked = 0
+        write_metrics = Counter()
+        for worker_latencies, worker_errors, worker_locked, worker_metrics \
+                in results:
+            for kind, values in worker_latencies.items():
+                latencies[kind].extend(values)
+            errors += worker_errors
+            locked += worker_locked
+            write_metrics.update(worker_metrics)
+        done = sum(len(values) for values in latencies.values())
+        report = {
+            'requests': done,
+            'errors': errors,
+            'locked_errors': locked,
+            'throughput_rps': round(done / options['duration'], 2),
+            'writes': {name: round(value, 3)
+                       for name, value in sorted(write_metrics.items())},
+        }
+        for kind, values in latencies.items():
+            if values:
+                report[f'{kind}_p50_ms'] = round(percentile(values, 0.5), 3)
+                report[f'{kind}_p95_ms'] = round(percentile(values, 0.95), 3)
+        return report
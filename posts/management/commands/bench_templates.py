@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from posts.management.bench import BenchCommand
+from yatube import warmup
+
+from .bench_views import Command as BenchViewsCommand
+from .bench_views import add_view_arguments
+
+
+class Command(BenchViewsCommand):
+    help = ('Сравнивает отрисовку страниц с загрузчиком шаблонов без кэша '
+            'и с кэширующим загрузчиком после warm_up(); результат '
+            'выводится в JSON')
+
+    def add_arguments(self, parser):
+        # Без --cold: кэш фрагментов очищается всегда.
+        BenchCommand.add_arguments(self, parser)
+        add_view_arguments(parser)
+
+    def report(self, options):
+        # Кэш фрагментов очищается перед каждым запросом, иначе он
+        # скрывает отрисовку шаблонов.
+        options['cold'] = True
+        template = settings.TEMPLATES[0]
+        report = {'profiles': {}}
+        for profile, cached in (('uncached', False), ('cached', True)):
+            options_ = dict(template['OPTIONS'],
+                            loaders=warmup.loaders(cached))
+            with override_settings(
+                    TEMPLATES=[dict(template, OPTIONS=options_)]):
+                reader = self.prepare(options)
+                result = {}
+                if cached:
+                    started = time.perf_counter()
+                    result['templates'] = warmup.warm_up()
+                    result['warm_up_ms'] = round(
+                        (time.perf_counter() - started) * 1000, 3)
+                result['views'] = self.measure_views(options)
+            report['profiles'][profile] = result
+        report['reader'] = reader.username
+        before, after = (report['profiles'][profile]['views']
+                         for profile in ('uncached', 'cached'))
+        report['speedup_p50'] = {
+            name: round(before[name]['p50_ms'] / after[name]['p50_ms'], 2)
+            for name in after}
+
+        return report
@@ -0,0 +1,113 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.test import Client
+from django.urls import reverse
+
+from posts.management.bench import (BenchCommand, capture_queries,
+                                    percentile)
+from posts.models import Group, Post, User
+
+VIEWS = ('index', 'group', 'profile', 'post', 'follow_index')
+
+
+def add_view_arguments(parser):
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Запросов на каждую страницу')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=5,
+                        help='Из скольких первых страниц выбирать ?page=')
+    parser.add_argument('--views', nargs='+', choices=VIEWS,
+                        default=list(VIEWS))
+    parser.add_argument('--seed', type=int, default=0)
+
+
+class Command(BenchCommand):
+    help = ('Замеряет задержку, число запросов и пропускную способность '
+            'страниц лент; результат выводится в JSON')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        add_view_arguments(parser)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+
+    def report(self, options):
+        reader = self.prepare(options)
+        return {
+            'reader': reader.username,
+            'cold_cache': options['cold'],
+            'views': self.measure_views(options),
+        }
+
+    def prepare(self, options):
+        """Клиент с вошедшим читателем и выборки адресов страниц."""
+        self.rnd = random.Random(options['seed'])
+        reader = (User.objects.order_by('-stats__following_count')
+                  .first())
+        if reader is None or not Post.objects.exists():
+            raise CommandError('В базе нет данных, запустите generate_data')
+        # Адрес не из INTERNAL_IPS, чтобы не подключался debug_toolbar.
+        self.client = Client(REMOTE_ADDR='10.0.0.1')
+        self.client.force_login(reader)
+        self.samples = {
+            'group': list(Group.objects.values_list('slug', flat=True)[:100]),
+            'profile': list(User.objects.order_by('-stats__posts_count')
+                            .values_list('username', flat=True)[:100]),
+            'post': list(Post.objects.order_by('-id')
+                         .values_list('author__username', 'id')[:100]),
+        }
+        return reader
+
+    def measure_views(self, options):
+        results = {}
+        for name in options['views']:
+            if not self.samples.get(name, True):
+                continue
+            for _ in range(options['warmup']):
+                self.client.get(self.url(name, options['pages']))
+            results[name] = self.measure(name, options)
+        return results
+
+    def url(self, name, pages):
+        page = f'?page={self.rnd.randint(1, pages)}'
+        if name in ('index', 'follow_index'):
+            return reverse(name) + page
+        if name == 'group':
+            slug = self.rnd.choice(self.samples['group'])
+            return reverse(name, kwargs={'slug': slug}) + page
+        if name == 'profile':
+            username = self.rnd.choice(self.samples['profile'])
+            return reverse(name, kwargs={'username': username}) + page
+        username, post_id = self.rnd.choice(self.samples['post'])
+        return reverse(name, kwargs={'username': username,
+                                     'post_id': post_id})
+
+    def measure(self, name, options):
+        latencies = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            url = self.url(name, options['pages'])
+            if options['cold']:
+                cache.clear()
+            with capture_queries() as captured:
+                begin = time.perf_counter()
+                response = self.client.get(url)
+                latencies.append((time.perf_counter() - begin) * 1000)
+            queries.append(sum(captured))
+            errors += response.status_code != 200
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+        }
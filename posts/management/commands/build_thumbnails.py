@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.bulk import chunked, id_batches
+from posts.models import Post
+from posts.storage import stored_files
+from yatube.workers import process_pool
+
+UPLOAD_DIR = Post._meta.get_field('image').upload_to
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие миниатюры изображений записей и их '
+            'копии в форматах POST_IMAGE_FORMATS в пуле процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Процессов в пуле, 0 — без пула')
+        parser.add_argument('--scan-media', action='store_true',
+                            help=f'Брать все файлы из MEDIA_ROOT/'
+                                 f'{UPLOAD_DIR}, а не изображения записей')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers is None:
+            workers = settings.THUMBNAIL_WORKERS
+        pool = process_pool(workers) if workers else None
+        batches = (self.media_batches(options['batch_size'])
+                   if options['scan_media']
+                   else self.post_batches(options['batch_size']))
+        built = failed = 0
+        try:
+            for names in batches:
+                results = (pool.map(thumbnails.build, names) if pool
+                           else map(thumbnails.build, names))
+                for result in results:
+                    built += result
+                    failed += not result
+        finally:
+            if pool:
+                pool.shutdown()
+        self.stdout.write(f'Изображений обработано: {built}, '
+                          f'с ошибками: {failed}')
+
+    def post_batches(self, batch_size):
+        with_images = Post.objects.exclude(image='').exclude(image=None)
+        seen = set()
+        for ids in id_batches(with_images, batch_size):
+            names = set(Post.objects.filter(id__in=ids)
+                        .values_list('image', flat=True)) - seen
+            seen |= names
+            yield names
+
+    def media_batches(self, batch_size):
+        return chunked(
+            stored_files(default_storage, UPLOAD_DIR.rstrip('/')), batch_size)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import thumbnails
+from posts.bulk import chunked, in_batch_size
+from posts.models import Post
+from posts.storage import (ContentAddressedStorage, content_addressed,
+                           content_name, stored_files)
+
+UPLOAD_DIR = Post._meta.get_field('image').upload_to.rstrip('/')
+
+
+class Command(BaseCommand):
+    help = (f'Переносит файлы MEDIA_ROOT/{UPLOAD_DIR} под имена по '
+            f'содержимому, склеивает дубли и удаляет файлы без ссылок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('DEFAULT_FILE_STORAGE должно быть '
+                               'posts.storage.ContentAddressedStorage')
+        moved = duplicates = 0
+        legacy = (name for name in stored_files(default_storage, UPLOAD_DIR)
+                  if not content_addressed(name))
+        for names in chunked(legacy, options['batch_size']):
+            for name in names:
+                duplicates += self.move(name)
+                moved += 1
+        released = 0
+        for names in chunked(stored_files(default_storage, UPLOAD_DIR),
+                             in_batch_size(options['batch_size'])):
+            referenced = set(Post.objects.filter(image__in=names)
+                             .values_list('image', flat=True))
+            for name in set(names) - referenced:
+                if content_addressed(name):
+                    released += thumbnails.discard(name)
+        # Страницы в кэше ссылаются на старые имена файлов.
+        cache.clear()
+        self.stdout.write(f'Файлов перенесено: {moved}, из них дублей: '
+                          f'{duplicates}, удалено без ссылок: {released}')
+
+    def move(self, name):
+        """Переносит файл под имя по содержимому; True для дубля."""
+        with default_storage.open(name) as file:
+            target = content_name(name, file)
+            duplicate = default_storage.exists(target)
+            if not duplicate:
+                default_storage.save(name, file)
+        Post.objects.filter(image=name).update(image=target)
+        thumbnails.discard(name, grace=0)
+        if not duplicate:
+            thumbnails.build(target)
+        return duplicate
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, записи, комментарии и подписки в NDJSON '
+            'с постоянным расходом памяти')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='Файл NDJSON, по умолчанию stdout')
+        parser.add_argument('--models', nargs='+', choices=transfer.MODELS,
+                            default=list(transfer.MODELS))
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # Порядок зависимостей не зависит от порядка в --models.
+        models = [name for name in transfer.MODELS
+                  if name in options['models']]
+        lines = transfer.export_lines(models, options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line)
+            return
+        total = 0
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(line + '\n')
+                total += 1
+        self.stdout.write(f'Выгружено строк: {total}')
@@ -0,0 +1,158 @@
+import os
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import bulk_insert, rebuild_derived
+from posts.models import Comment, Follow, Group, Post, User
+from posts.stats import create_user_stats
+
+WORDS = ('котики погода город утро новости кофе книга море горы поезд '
+         'работа отпуск музыка кино друзья дом сад осень весна лето').split()
+IMAGE_SIZES = ((640, 480), (1280, 720), (1920, 1080), (800, 1200))
+
+
+def random_text(rnd, low, high):
+    return ' '.join(rnd.choices(WORDS, k=rnd.randint(low, high))).capitalize()
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными реалистичной формы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=5_000_000)
+        parser.add_argument('--comments', type=int, default=20_000_000)
+        parser.add_argument('--follows-per-user', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Показатель закона Ципфа для популярности '
+                                 'авторов')
+        parser.add_argument('--image-ratio', type=float, default=0.1)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить записи')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Не пересчитывать счётчики и ленты')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        popularity = list(accumulate(
+            1 / rank ** options['skew'] for rank in range(1, len(user_ids) + 1)
+        ))
+        self.create_follows(user_ids, popularity,
+                            options['follows_per_user'])
+        images = self.create_images()
+        post_ids = self.create_posts(options['posts'], user_ids, popularity,
+                                     group_ids, images,
+                                     options['image_ratio'])
+        self.create_comments(options['comments'], post_ids, user_ids)
+        if not options['skip_derived']:
+            self.stdout.write('Пересчёт счётчиков и лент подписок...')
+            rebuild_derived(self.chunk_size)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def new_ids(self, model, create):
+        start = model.objects.aggregate(last=Max('id'))['last'] or 0
+        created = create()
+        end = model.objects.aggregate(last=Max('id'))['last'] or 0
+        self.stdout.write(f'{model.__name__}: {created}')
+        return range(start + 1, end + 1)
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.rnd.random() * self.period)
+
+    def create_users(self, amount):
+        password = make_password('password')
+        prefix = f'gen{self.rnd.randrange(16 ** 6):06x}'
+        users = (
+            User(username=f'{prefix}_{num}', password=password,
+                 first_name=self.rnd.choice(WORDS).capitalize(),
+                 last_name=self.rnd.choice(WORDS).capitalize())
+            for num in range(amount)
+        )
+        user_ids = self.new_ids(
+            User, lambda: bulk_insert(User, users, self.chunk_size))
+        create_user_stats(user_ids)
+        return user_ids
+
+    def create_groups(self, amount):
+        prefix = f'gen{self.rnd.randrange(16 ** 6):06x}'
+        groups = (
+            Group(title=random_text(self.rnd, 1, 3),
+                  slug=f'{prefix}-{num}',
+                  description=random_text(self.rnd, 3, 10))
+            for num in range(amount)
+        )
+        return self.new_ids(
+            Group, lambda: bulk_insert(Group, groups, self.chunk_size))
+
+    def create_follows(self, user_ids, popularity, per_user):
+        def follows():
+            for user_id in user_ids:
+                amount = min(int(self.rnd.expovariate(1 / per_user)),
+                             len(user_ids) - 1)
+                authors = set(self.rnd.choices(
+                    user_ids, cum_weights=popularity, k=amount))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.new_ids(Follow, lambda: bulk_insert(
+            Follow, follows(), self.chunk_size, ignore_conflicts=True))
+
+    def create_images(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for num, size in enumerate(IMAGE_SIZES):
+            name = f'posts/generated_{num}.jpg'
+            color = tuple(self.rnd.randrange(256) for _ in range(3))
+            Image.new('RGB', size, color).save(
+                os.path.join(settings.MEDIA_ROOT, name), quality=85)
+            names.append(name)
+        return names
+
+    def create_posts(self, amount, user_ids, popularity, group_ids,
+                     images, image_ratio):
+        groups = [None] + list(group_ids)
+        posts = (
+            Post(text=random_text(self.rnd, 5, 60),
+                 author_id=self.rnd.choices(
+                     user_ids, cum_weights=popularity)[0],
+                 group_id=self.rnd.choice(groups),
+                 pub_date=self.random_date(),
+                 image=(self.rnd.choice(images)
+                        if self.rnd.random() < image_ratio else None))
+            for _ in range(amount)
+        )
+        return self.new_ids(
+            Post, lambda: bulk_insert(Post, posts, self.chunk_size))
+
+    def create_comments(self, amount, post_ids, user_ids):
+        if not post_ids:
+            return
+        comments = (
+            Comment(text=random_text(self.rnd, 2, 25),
+                    post_id=self.rnd.choice(post_ids),
+                    author_id=self.rnd.choice(user_ids),
+                    created=self.random_date())
+            for _ in range(amount)
+        )
+        self.new_ids(
+            Comment, lambda: bulk_insert(Comment, comments, self.chunk_size))
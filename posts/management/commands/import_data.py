@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+from posts.bulk import rebuild_derived
+
+
+class Command(BaseCommand):
+    help = ('Загружает NDJSON из export_data пачками bulk_create и '
+            'пересобирает счётчики и ленты подписок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON, «-» — stdin')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Не пересчитывать счётчики и ленты')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            read, skipped = self.load(sys.stdin, options)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                read, skipped = self.load(file, options)
+        for name in transfer.MODELS:
+            if read[name]:
+                self.stdout.write(f'{name}: прочитано {read[name]}, '
+                                  f'пропущено {skipped[name]}')
+        if not options['skip_derived']:
+            self.stdout.write('Пересчёт счётчиков и лент подписок...')
+            rebuild_derived(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def load(self, lines, options):
+        try:
+            return transfer.import_records(transfer.read_records(lines),
+                                           options['chunk_size'])
+        except transfer.TransferError as error:
+            raise CommandError(error)
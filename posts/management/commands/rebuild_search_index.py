@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Переиндексирует записи и комментарии для полнотекстового '
+            'поиска пачками, не блокируя поиск')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError(
+                'Полнотекстовый поиск работает только на SQLite')
+        total = search.rebuild(options['batch_size'])
+        self.stdout.write(f'Проиндексировано строк: {total}')
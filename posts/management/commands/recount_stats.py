@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import id_batches
+from posts.models import Post, User
+from posts.stats import recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики записей, комментариев и подписок '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed_users = sum(
+            recount_users(ids)
+            for ids in id_batches(User.objects.all(), batch_size))
+        fixed_posts = sum(
+            recount_posts(ids)
+            for ids in id_batches(Post.objects.all(), batch_size))
+        self.stdout.write(
+            f'Исправлено пользователей: {fixed_users}, '
+            f'записей: {fixed_posts}')
@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import replica
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в реплику для чтения ленты'
+
+    def handle(self, *args, **options):
+        if not replica.replica_enabled():
+            raise CommandError(f'Реплика выключена: нужны REPLICA_ENABLED '
+                               f'и база {settings.REPLICA_DATABASE} '
+                               f'в DATABASES')
+        started = time.perf_counter()
+        if not replica.refresh():
+            self.stdout.write('Реплика совпадает с основной базой')
+            return
+        self.stdout.write(f'Реплика обновлена за '
+                          f'{time.perf_counter() - started:.2f} с')
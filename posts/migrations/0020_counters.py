@@ -0,0 +1,46 @@
+# Generated by Django 2.2.6 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0019_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunSQL(
+            sql=[
+                'UPDATE posts_post SET comments_count = ('
+                'SELECT COUNT(*) FROM posts_comment c '
+                'WHERE c.post_id = posts_post.id)',
+                'INSERT INTO posts_userstats '
+                '(user_id, posts_count, followers_count, following_count) '
+                'SELECT u.id, '
+                '(SELECT COUNT(*) FROM posts_post p WHERE p.author_id = u.id), '
+                '(SELECT COUNT(*) FROM posts_follow f '
+                'WHERE f.author_id = u.id), '
+                '(SELECT COUNT(*) FROM posts_follow f WHERE f.user_id = u.id) '
+                'FROM auth_user u',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
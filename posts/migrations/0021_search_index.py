@@ -0,0 +1,79 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:00
+
+from django.db import migrations
+
+# Схема индекса на момент миграции. Миграция не импортирует
+# posts.search: его правки не должны менять уже применённые шаги.
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+    "text, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS posts_search_post_insert '
+    'AFTER INSERT ON posts_post BEGIN '
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'VALUES (new.id, new.text, new.id); END',
+    'CREATE TRIGGER IF NOT EXISTS posts_search_post_update '
+    'AFTER UPDATE OF text ON posts_post BEGIN '
+    'DELETE FROM posts_search WHERE rowid = old.id; '
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'VALUES (new.id, new.text, new.id); END',
+    'CREATE TRIGGER IF NOT EXISTS posts_search_post_delete '
+    'AFTER DELETE ON posts_post BEGIN '
+    'DELETE FROM posts_search WHERE rowid = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS posts_search_comment_insert '
+    'AFTER INSERT ON posts_comment BEGIN '
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'VALUES (-new.id, new.text, new.post_id); END',
+    'CREATE TRIGGER IF NOT EXISTS posts_search_comment_update '
+    'AFTER UPDATE OF text, post_id ON posts_comment BEGIN '
+    'DELETE FROM posts_search WHERE rowid = -old.id; '
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'VALUES (-new.id, new.text, new.post_id); END',
+    'CREATE TRIGGER IF NOT EXISTS posts_search_comment_delete '
+    'AFTER DELETE ON posts_comment BEGIN '
+    'DELETE FROM posts_search WHERE rowid = -old.id; END',
+)
+
+FILL = (
+    'DELETE FROM posts_search',
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'SELECT id, text, id FROM posts_post',
+    'INSERT INTO posts_search (rowid, text, post_id) '
+    'SELECT -id, text, post_id FROM posts_comment',
+)
+
+DROP = (
+    'DROP TRIGGER IF EXISTS posts_search_post_insert',
+    'DROP TRIGGER IF EXISTS posts_search_post_update',
+    'DROP TRIGGER IF EXISTS posts_search_post_delete',
+    'DROP TRIGGER IF EXISTS posts_search_comment_insert',
+    'DROP TRIGGER IF EXISTS posts_search_comment_update',
+    'DROP TRIGGER IF EXISTS posts_search_comment_delete',
+    'DROP TABLE IF EXISTS posts_search',
+)
+
+
+def execute(schema_editor, statements):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    execute(schema_editor, SCHEMA + FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    execute(schema_editor, DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -17,6 +17,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    FEED_RELATED = ('author', 'group')
+
+    def for_feed(self):
+        """Посты вместе с авторами и группами одним запросом."""
+        return self.select_related(*self.FEED_RELATED)
+
+    def with_comments(self):
+        """Подгружает комментарии поста вместе с их авторами."""
+        return self.prefetch_related(models.Prefetch(
+            'comments',
+            queryset=Comment.objects.select_related('author'),
+        ))
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name="Текст сообщения",
@@ -33,9 +48,22 @@ class Post(models.Model):
                               verbose_name="Группа",
                               help_text="Выберете группу для публикации")
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comments_count = models.PositiveIntegerField(
+        verbose_name="Количество комментариев",
+        default=0,
+        editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -55,6 +83,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -73,3 +105,49 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_following')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="stats")
+    posts_count = models.PositiveIntegerField(
+        verbose_name="Количество записей", default=0)
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков", default=0)
+    following_count = models.PositiveIntegerField(
+        verbose_name="Количество подписок", default=0)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-pub_date", "-post_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author', 'pub_date', 'post'],
+                         name='timeline_user_author_date_idx'),
+        ]
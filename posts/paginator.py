@@ -0,0 +1,153 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from yatube.settings import POSTS_ON_PAGE
+
+CURSOR_ORDERING = ('-pub_date', '-id')
+# Наибольший id, который помещается в INTEGER SQLite.
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def encode_cursor(obj, ordering=CURSOR_ORDERING):
+    date_field, id_field = (name.lstrip('-') for name in ordering)
+    raw = f'{getattr(obj, date_field).isoformat()}|{getattr(obj, id_field)}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, id) из токена или None, если токен битый."""
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        pub_date, post_id = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        post_id = int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError):
+        return None
+    if pub_date is None or not 0 < post_id <= MAX_CURSOR_ID:
+        return None
+    return pub_date, post_id
+
+
+class CursorPage:
+    """Страница ленты, выбранная по курсору (дата, id).
+
+    Повторяет ту часть интерфейса django.core.paginator.Page,
+    которой пользуются шаблоны, но не считает COUNT(*) и не
+    использует OFFSET.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, key, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = key
+        self._has_next = has_next
+        self._has_previous = has_previous
+        ordering = paginator.ordering
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list and has_next:
+            self.next_cursor = encode_cursor(object_list[-1], ordering)
+        if object_list and has_previous:
+            self.previous_cursor = encode_cursor(object_list[0], ordering)
+
+    def __repr__(self):
+        return f'<Cursor page {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация ленты по убыванию (дата, id).
+
+    По умолчанию лента упорядочена по (-pub_date, -id) постов;
+    ordering позволяет листать и другие таблицы с теми же ключами.
+    """
+
+    def __init__(self, object_list, per_page, ordering=CURSOR_ORDERING):
+        self.ordering = ordering
+        self.date_field, self.id_field = (
+            name.lstrip('-') for name in ordering)
+        self.object_list = object_list.order_by(*ordering)
+        self.per_page = int(per_page)
+
+    def _seek(self, queryset, lookup, key):
+        """Строки после ключа; объекты, не являющиеся QuerySet, могут
+        задать свой поиск методом seek(lookup, key)."""
+        if hasattr(queryset, 'seek'):
+            return queryset.seek(lookup, key)
+        pub_date, obj_id = key
+        return queryset.filter(
+            Q(**{f'{self.date_field}__{lookup}': pub_date})
+            | Q(**{self.date_field: pub_date,
+                   f'{self.id_field}__{lookup}': obj_id}))
+
+    def get_page(self, after=None, before=None):
+        after_key = decode_cursor(after)
+        before_key = decode_cursor(before) if after_key is None else None
+
+        if before_key is not None:
+            rows = list(
+                self._seek(self.object_list, 'gt', before_key)
+                .order_by(self.date_field, self.id_field)[:self.per_page + 1]
+            )
+            if rows:
+                has_previous = len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+                return CursorPage(rows, self, f'before:{before}',
+                                  has_next=True, has_previous=has_previous)
+
+        queryset = self.object_list
+        key = 'first'
+        if after_key is not None:
+            queryset = self._seek(queryset, 'lt', after_key)
+            key = f'after:{after}'
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, key,
+                          has_next=has_next,
+                          has_previous=after_key is not None)
+
+
+def get_page(request, queryset, per_page=POSTS_ON_PAGE,
+             ordering=CURSOR_ORDERING, cursor=False):
+    """Страница ленты для запроса.
+
+    Параметры ?after=/?before= включают курсорный режим. При
+    CURSOR_PAGINATION = True курсорный режим используется по умолчанию,
+    а старые ссылки вида ?page= продолжают работать. cursor=True
+    включает курсорный режим всегда.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    cursor_default = cursor or (settings.CURSOR_PAGINATION
+                                and 'page' not in request.GET)
+    if after or before or cursor_default:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        return paginator.get_page(after, before)
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
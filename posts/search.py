@@ -0,0 +1,182 @@
+"""Полнотекстовый поиск по записям и комментариям на SQLite FTS5.
+
+Индекс posts_search хранит текст записей (rowid = id записи) и
+комментариев (rowid = -id комментария) вместе с id записи, к которой
+относится строка. Синхронизацию ведут триггеры базы, поэтому индекс
+обновляется и при bulk_create, и при правках в обход моделей.
+
+SQLite удаляет триггеры вместе с таблицей, а миграции на SQLite
+пересоздают таблицу при изменении полей, поэтому create_index()
+идемпотентна и повторяется после каждого migrate.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .bulk import id_batches
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+TRIGGERS = ('post_insert', 'post_update', 'post_delete',
+            'comment_insert', 'comment_update', 'comment_delete')
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    f"text, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_post_insert '
+    f'AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'VALUES (new.id, new.text, new.id); END',
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_post_update '
+    f'AFTER UPDATE OF text ON posts_post BEGIN '
+    f'DELETE FROM {TABLE} WHERE rowid = old.id; '
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'VALUES (new.id, new.text, new.id); END',
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_post_delete '
+    f'AFTER DELETE ON posts_post BEGIN '
+    f'DELETE FROM {TABLE} WHERE rowid = old.id; END',
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_insert '
+    f'AFTER INSERT ON posts_comment BEGIN '
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'VALUES (-new.id, new.text, new.post_id); END',
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_update '
+    f'AFTER UPDATE OF text, post_id ON posts_comment BEGIN '
+    f'DELETE FROM {TABLE} WHERE rowid = -old.id; '
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'VALUES (-new.id, new.text, new.post_id); END',
+    f'CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_delete '
+    f'AFTER DELETE ON posts_comment BEGIN '
+    f'DELETE FROM {TABLE} WHERE rowid = -old.id; END',
+)
+
+FILL = (
+    f'DELETE FROM {TABLE}',
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'SELECT id, text, id FROM posts_post',
+    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+    f'SELECT -id, text, post_id FROM posts_comment',
+)
+
+RANKED = (
+    f'SELECT post_id, MIN(rank) AS score FROM ('
+    f'SELECT post_id, rank FROM {TABLE} WHERE {TABLE} MATCH %s) '
+    f'GROUP BY post_id ORDER BY score, post_id DESC LIMIT %s OFFSET %s'
+)
+COUNT = f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} WHERE {TABLE} MATCH %s'
+POST_ROWS = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid > 0'
+
+
+def available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_index(using=connection):
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_index(using=connection):
+    with using.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLE}_{name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def fill_index(using=connection):
+    with using.cursor() as cursor:
+        for statement in FILL:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH: все слова, без операторов."""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"' for word in words)
+
+
+class SearchResults:
+    """Записи, найденные по запросу, в порядке bm25.
+
+    Поддерживает count() и срезы, поэтому подходит для Paginator:
+    каждая страница — один запрос к индексу и один к posts_post.
+    """
+    ordered = True
+
+    def __init__(self, query, queryset=None):
+        self.match = match_expression(query)
+        self.queryset = (Post.objects.for_feed()
+                         if queryset is None else queryset)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = 0
+            if self.match:
+                with connection.cursor() as cursor:
+                    cursor.execute(COUNT, [self.match])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if not self.match or index.stop is not None and index.stop <= start:
+            return []
+        limit = -1 if index.stop is None else index.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(RANKED, [self.match, limit, start])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def filter_posts(queryset, query):
+    """Записи queryset, в тексте которых есть все слова запроса."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    # RawSQL в id__in даёт «IN ((SELECT ...))», а это скалярный
+    # подзапрос SQLite с одной первой строкой.
+    table = queryset.model._meta.db_table
+    return queryset.extra(where=[f'{table}.id IN ({POST_ROWS})'],
+                          params=[match])
+
+
+def rebuild(batch_size):
+    """Переиндексирует записи и комментарии пачками по id.
+
+    Индекс остаётся доступным для поиска на всё время пересборки:
+    строки пачки заменяются в одной транзакции, а строки удалённых
+    объектов убираются в конце. Возвращает число проиндексированных строк.
+    """
+    create_index()
+    total = 0
+    sources = ((Post, 'id', 1), (Comment, 'post_id', -1))
+    for model, post_field, sign in sources:
+        for ids in id_batches(model.objects.all(), batch_size):
+            rows = model.objects.filter(id__in=ids).values_list(
+                'id', 'text', post_field)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {TABLE} WHERE rowid = %s',
+                    [(sign * pk,) for pk in ids])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, text, post_id) '
+                    f'VALUES (%s, %s, %s)',
+                    [(sign * pk, text, post_id)
+                     for pk, text, post_id in rows])
+            total += len(ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid > 0 AND rowid NOT IN '
+            f'(SELECT id FROM posts_post)')
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid < 0 AND -rowid NOT IN '
+            f'(SELECT id FROM posts_comment)')
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
@@ -0,0 +1,116 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import conditional, stats, storage, thumbnails, timeline, versions
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False,
+                      update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        versions.bump('posts')
+        conditional.touch_profiles(instance)
+
+
+@receiver(post_save, sender=Group)
+def touch_group(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versions.bump(f'group:{instance.slug}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    instance._old_group_id = None
+    instance._old_image = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is None or {'group', 'image'} & set(update_fields):
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None))
+
+
+def release_image(name):
+    """Удаляет файл с именем по содержимому, если на него больше
+    не ссылается ни одна запись. Недавно загруженный файл проверяется
+    ещё раз, когда истечёт CONTENT_RELEASE_GRACE."""
+    if (storage.content_addressed(name)
+            and not Post.objects.filter(image=name).exists()):
+        thumbnails.discard(name, recheck=partial(release_image, name))
+
+
+def release_image_on_commit(name):
+    if storage.content_addressed(name):
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, update_fields=None,
+                 **kwargs):
+    if raw:
+        return
+    if created:
+        stats.change_user_stats(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    timeline.touch_followers(instance.author_id)
+    conditional.touch_post(instance, instance.group_id,
+                           instance._old_group_id)
+    image_saved = update_fields is None or 'image' in update_fields
+    if image_saved and instance.image.name != instance._old_image:
+        thumbnails.forget(instance._old_image)
+        release_image_on_commit(instance._old_image)
+        if instance.image:
+            thumbnails.schedule_on_commit(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def drop_post_from_feeds(sender, instance, **kwargs):
+    thumbnails.forget(instance.image.name)
+    release_image_on_commit(instance.image.name)
+    stats.change_user_stats(instance.author_id, posts_count=-1)
+    timeline.touch_followers(instance.author_id)
+    conditional.touch_post(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change_comments_count(instance.post_id, 1)
+    if not raw:
+        conditional.touch_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change_comments_count(instance.post_id, -1)
+    conditional.touch_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change_user_stats(instance.author_id, followers_count=1)
+        stats.change_user_stats(instance.user_id, following_count=1)
+        timeline.followers_changed(instance.author_id, 1)
+        timeline.backfill(instance.user, instance.author)
+        versions.bump(f'feed:{instance.user_id}')
+        conditional.touch_profiles(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    stats.change_user_stats(instance.author_id, followers_count=-1)
+    stats.change_user_stats(instance.user_id, following_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id, -1)
+    versions.bump(f'feed:{instance.user_id}')
+    conditional.touch_profiles(instance.user, instance.author)
@@ -0,0 +1,84 @@
+"""Денормализованные счётчики записей, комментариев и подписок.
+
+Счётчики меняются атомарно через F()-выражения в сигналах моделей,
+а recount_* пересчитывают их по данным и исправляют расхождения.
+"""
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def create_user_stats(user_ids):
+    """Создаёт нулевые UserStats для пользователей, загруженных bulk_create."""
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True)
+
+
+def change_user_stats(user_id, **deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    updated = UserStats.objects.filter(user_id=user_id).update(**changes)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount_users([user_id])
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(id=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def _grouped_counts(model, key, ids):
+    return dict(
+        model.objects.filter(**{f'{key}__in': ids})
+        .order_by()
+        .values(key)
+        .annotate(total=Count('id'))
+        .values_list(key, 'total')
+    )
+
+
+def recount_users(user_ids):
+    """Пересчитывает UserStats пользователей, возвращает число исправленных."""
+    user_ids = list(User.objects.filter(id__in=user_ids)
+                    .values_list('id', flat=True))
+    actual = {
+        field: _grouped_counts(model, key, user_ids)
+        for field, (model, key) in USER_COUNTERS.items()
+    }
+    existing = UserStats.objects.in_bulk(user_ids)
+    to_create = []
+    to_update = []
+    for user_id in user_ids:
+        values = {field: counts.get(user_id, 0)
+                  for field, counts in actual.items()}
+        stats = existing.get(user_id)
+        if stats is None:
+            to_create.append(UserStats(user_id=user_id, **values))
+            continue
+        if any(getattr(stats, field) != value
+               for field, value in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            to_update.append(stats)
+    UserStats.objects.bulk_create(to_create, ignore_conflicts=True)
+    UserStats.objects.bulk_update(to_update, list(USER_COUNTERS))
+    return len(to_create) + len(to_update)
+
+
+def recount_posts(post_ids):
+    """Пересчитывает Post.comments_count, возвращает число исправленных."""
+    actual = _grouped_counts(Comment, 'post_id', post_ids)
+    drifted = []
+    for post in Post.objects.filter(id__in=post_ids).only('comments_count'):
+        count = actual.get(post.id, 0)
+        if post.comments_count != count:
+            post.comments_count = count
+            drifted.append(post)
+    Post.objects.bulk_update(drifted, ['comments_count'])
+    return len(drifted)
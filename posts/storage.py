@@ -0,0 +1,81 @@
+"""Хранилище медиафайлов с именами по содержимому.
+
+Файлы из каталогов CONTENT_ADDRESSED_DIRS сохраняются под именем
+<каталог>/<ab>/<sha256>.<расширение>, где хэш считается по загруженным
+байтам. Одинаковые загрузки лежат на диске один раз, а миниатюры,
+которые sorl строит по имени файла, общие для всех записей с этим
+изображением. Остальные файлы (миниатюры, копии в WebP) сохраняются
+как обычно.
+
+Ссылки на файл считаются по записям, которые на него указывают (см.
+signals.release_image): файл удаляется вместе с миниатюрами, когда
+исчезает последняя из них.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_NAME = re.compile(r'^(?P<directory>.+)/[0-9a-f]{2}/[0-9a-f]{64}'
+                          r'(\.\w+)?$')
+
+
+def content_addressed(name):
+    """Имя файла выдано по содержимому."""
+    match = CONTENT_NAME.match(name or '')
+    return bool(match) and (match.group('directory')
+                            in settings.CONTENT_ADDRESSED_DIRS)
+
+
+def content_name(name, content):
+    """Имя по SHA-256 содержимого в каталоге исходного имени."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    hexdigest = digest.hexdigest()
+    extension = posixpath.splitext(name)[1].lower()
+    return (f'{posixpath.dirname(name)}/{hexdigest[:2]}/'
+            f'{hexdigest}{extension}')
+
+
+def stored_files(storage, directory):
+    """Все файлы каталога хранилища, включая подкаталоги."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in sorted(files):
+        yield f'{directory}/{name}'
+    for name in sorted(directories):
+        yield from stored_files(storage, f'{directory}/{name}')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который не хранит одинаковые загрузки дважды."""
+
+    def hashed(self, name):
+        directory = posixpath.dirname(name)
+        return directory in settings.CONTENT_ADDRESSED_DIRS
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not self.hashed(name):
+            return super().save(name, content, max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения не даёт release_image() удалить
+            # файл, пока запись с повторной загрузкой не сохранена.
+            os.utime(self.path(name))
+            return name
+        saved = self._save(name, content)
+        if saved != name:
+            # Тот же файл одновременно сохранил другой процесс.
+            self.delete(saved)
+        return name
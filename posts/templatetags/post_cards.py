@@ -0,0 +1,16 @@
+from django import template
+
+from posts.cards import PostCards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка записи, как {% include "includes/incl_post_block.html" %};
+    адреса разворачиваются один раз на отрисовку страницы."""
+    cards = context.render_context.get(PostCards)
+    if cards is None:
+        cards = context.render_context[PostCards] = PostCards(
+            context.get('user'), context.use_tz, context.use_l10n)
+    return cards.render(post)
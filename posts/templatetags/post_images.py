@@ -0,0 +1,24 @@
+from django import template
+
+from posts import thumbnails
+from posts.models import Post
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, *geometries):
+    """Подгружает записи KVStore о миниатюрах всех записей страницы
+    или одной записи."""
+    if isinstance(posts, Post):
+        posts = [posts]
+    thumbnails.prefetch([post.image.name for post in posts if post.image],
+                        geometries or None)
+    return ''
+
+
+@register.inclusion_tag('includes/picture.html')
+def post_picture(image, geometry, sizes='100vw'):
+    """<picture> с миниатюрой размера geometry из POST_THUMBNAILS;
+    srcset берётся из лестницы ширин POST_IMAGE_WIDTHS."""
+    return dict(thumbnails.picture(image, geometry), sizes=sizes)
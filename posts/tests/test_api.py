@@ -0,0 +1,160 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
+        cls.group = Group.objects.create(title='Обо всём', slug='obo_vsem',
+                                         description='тестовая группа')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [Post.objects.create(text=f'запись {num}',
+                                         author=cls.author, group=cls.group)
+                     for num in range(12)]
+        cls.image_post = Post.objects.create(
+            text='с картинкой', author=cls.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif'))
+        Comment.objects.create(text='комментарий', author=cls.reader,
+                               post=cls.image_post)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiTests.reader)
+
+    def test_posts_are_paged_by_cursor(self):
+        """Лента листается ссылками next и previous"""
+
+        first = self.client.get(reverse('api_posts')).json()
+        self.assertEqual(len(first['results']), settings.POSTS_ON_PAGE)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(first['results'][0]['id'], ApiTests.image_post.id)
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 13)
+
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('api_group', kwargs={
+            'slug': 'obo_vsem'}), {'fields': 'id,text'})
+        data = response.json()
+        self.assertEqual(data['group']['title'], 'Обо всём')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertIn('fields=id%2Ctext', data['next'])
+
+        response = self.client.get(reverse('api_posts'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_post_with_image_and_comments(self):
+        """Пост отдаётся с комментариями и абсолютными адресами
+        изображения"""
+
+        response = self.reader_client.get(reverse('api_post', kwargs={
+            'username': 'author', 'post_id': ApiTests.image_post.id}))
+        data = response.json()
+        self.assertTrue(data['is_following'])
+        self.assertEqual(data['author']['posts_count'], 13)
+        self.assertEqual(data['comments'][0]['text'], 'комментарий')
+        image = data['post']['image']
+        self.assertTrue(image['original'].startswith(
+            f'http://testserver{settings.MEDIA_URL}posts/'))
+        self.assertTrue(image['src'].startswith('http://testserver/'))
+
+        missing = self.client.get(reverse('api_post', kwargs={
+            'username': 'reader', 'post_id': ApiTests.image_post.id}))
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(missing['Content-Type'], 'application/json')
+
+    def test_follow_feed_requires_login(self):
+        response = self.client.get(reverse('api_follow'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+        data = self.reader_client.get(reverse('api_follow')).json()
+        self.assertEqual(data['results'][0]['id'], ApiTests.image_post.id)
+        self.assertIsNotNone(data['next'])
+
+    def test_profile_without_stats(self):
+        """Профиль пользователя без строки UserStats отдаёт нулевые
+        счётчики"""
+
+        User.objects.bulk_create([User(username='bulk')])
+        self.assertFalse(UserStats.objects.filter(
+            user__username='bulk').exists())
+        response = self.client.get(reverse('api_profile', kwargs={
+            'username': 'bulk'}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        author = response.json()['author']
+        self.assertEqual((author['posts_count'], author['followers_count'],
+                          author['following_count']), (0, 0, 0))
+
+    def test_etag_revalidation(self):
+        """Повторный запрос без изменений получает 304, новый пост
+        меняет ETag"""
+
+        urls = [reverse('api_posts'), reverse('api_follow'),
+                reverse('api_profile', kwargs={'username': 'author'})]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                response = self.reader_client.get(url,
+                                                  HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+        etag = self.client.get(urls[0])['ETag']
+        Post.objects.create(text='новая', author=ApiTests.author)
+        response = self.client.get(urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_comment_changes_list_etags(self):
+        """Новый комментарий меняет comments_count, а значит и ETag
+        всех лент с постом"""
+
+        urls = [reverse('api_posts'), reverse('api_follow'),
+                reverse('api_group', kwargs={'slug': 'obo_vsem'}),
+                reverse('api_profile', kwargs={'username': 'author'})]
+        etags = {url: self.reader_client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(text='ещё один', author=ApiTests.reader,
+                               post=ApiTests.posts[-1])
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from posts.cards import PostCards
+from posts.models import Comment, Post, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
+        cls.author = User.objects.create_user(username='автор.1+x')
+        cls.other = User.objects.create_user(username='other')
+        cls.posts = [
+            Post.objects.create(text='первая строка\nвторая <b>&</b>',
+                                author=cls.author),
+            Post.objects.create(
+                text='с картинкой', author=cls.other,
+                image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                         content_type='image/gif')),
+        ]
+        Comment.objects.create(text='комментарий', author=cls.other,
+                               post=cls.posts[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def assertSameAsInclude(self, user):
+        cards = PostCards(user)
+        for post in Post.objects.select_related('author'):
+            with self.subTest(post=post.id, user=str(user)):
+                self.assertEqual(
+                    cards.render(post),
+                    render_to_string('includes/incl_post_block.html',
+                                     {'post': post, 'user': user}))
+
+    def test_cards_match_include(self):
+        """Карточка совпадает с шаблоном для автора, другого
+        пользователя и гостя"""
+
+        for user in (PostCardTests.author, PostCardTests.other,
+                     AnonymousUser()):
+            self.assertSameAsInclude(user)
+
+    def test_picture_with_sources_matches_include(self):
+        picture = {'src': '/media/cache/a.jpg',
+                   'srcset': '/media/cache/a.jpg 480w, /media/b.jpg 960w',
+                   'sources': [{'srcset': '/media/a.webp 480w',
+                                'type': 'image/webp'}]}
+        with mock.patch('posts.thumbnails.picture', return_value=picture):
+            self.assertSameAsInclude(PostCardTests.author)
+
+    def test_tag_in_page_template(self):
+        template = Template('{% load post_cards %}'
+                            '{% for post in posts %}{% post_card post %}'
+                            '{% endfor %}')
+        include = Template('{% for post in posts %}'
+                           '{% include "includes/incl_post_block.html" %}'
+                           '{% endfor %}')
+        context = {'posts': Post.objects.select_related('author'),
+                   'user': PostCardTests.other}
+        self.assertEqual(template.render(Context(context)),
+                         include.render(Context(context)))
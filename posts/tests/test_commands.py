@@ -0,0 +1,217 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                          UserStats)
+
+
+class GenerateDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def test_generate_data_and_benchmark(self):
+        """Генератор наполняет базу, бенчмарк выдаёт JSON-отчёт"""
+
+        call_command('generate_data', users=30, groups=3, posts=200,
+                     comments=300, follows_per_user=5, image_ratio=0.1,
+                     chunk_size=50, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertEqual(UserStats.objects.count(), 30)
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 200)
+        self.assertEqual(TimelineEntry.objects.exists(),
+                         Follow.objects.exists())
+
+        out = StringIO()
+        call_command('bench_views', requests=3, warmup=1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['views']),
+                         {'index', 'group', 'profile', 'post',
+                          'follow_index'})
+        for name, result in report['views'].items():
+            with self.subTest(view=name):
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries_per_request'], 0)
+
+        out = StringIO()
+        call_command('bench_templates', requests=2, warmup=1,
+                     views=['index', 'post'], stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertGreater(report['profiles']['cached']['templates'], 0)
+        self.assertEqual(set(report['speedup_p50']), {'index', 'post'})
+
+        out = StringIO()
+        path = f'{settings.MEDIA_ROOT}/bench_cards.json'
+        call_command('bench_cards', rounds=3, warmup=1, output=path,
+                     stdout=out)
+        self.assertTrue(json.loads(out.getvalue())['identical'])
+        with open(path) as file:
+            self.assertEqual(file.read(), out.getvalue().rstrip('\n'))
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        group = Group.objects.create(title='Обо всём', slug='obo_vsem',
+                                     description='тестовая группа')
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        posts = [Post.objects.create(text=f'запись {num}', author=author,
+                                     group=group if num % 2 else None)
+                 for num in range(5)]
+        for post in posts[:3]:
+            Comment.objects.create(text='комментарий', author=reader,
+                                   post=post)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def snapshot(self):
+        # Записи получают при загрузке новые id, сравниваются поля.
+        return {
+            'groups': list(Group.objects.values_list('slug', 'title')),
+            'posts': list(Post.objects.order_by('id').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+                'comments_count')),
+            'comments': list(Comment.objects.order_by('id').values_list(
+                'post__text', 'created', 'author__username')),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        }
+
+    def test_export_and_import_round_trip(self):
+        """Выгрузка и загрузка в пустую базу восстанавливают данные
+        и производные счётчики"""
+
+        path = f'{TransferTests.directory}/data.ndjson'
+        call_command('export_data', output=path, chunk_size=2,
+                     stdout=StringIO())
+        expected = self.snapshot()
+        for model in (Follow, Post, Group, User):
+            model.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_data', path, chunk_size=2, stdout=out)
+        self.assertIn('post: прочитано 5, пропущено 0', out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(
+            UserStats.objects.get(user__username='author').followers_count,
+            1)
+        self.assertEqual(TimelineEntry.objects.count(), 5)
+
+        out = StringIO()
+        call_command('import_data', path, stdout=out)
+        self.assertEqual(self.snapshot(), expected)
+        for line in ('group: прочитано 1, пропущено 1',
+                     'post: прочитано 5, пропущено 5',
+                     'comment: прочитано 3, пропущено 3',
+                     'follow: прочитано 1, пропущено 1'):
+            self.assertIn(line, out.getvalue())
+
+    def test_import_remaps_colliding_ids(self):
+        """id из файла, занятые в базе, не теряют строки и не цепляют
+        комментарии к чужим записям"""
+
+        group = Group.objects.get()
+        post = Post.objects.order_by('id').first()
+        path = f'{TransferTests.directory}/other.ndjson'
+        records = [
+            {'model': 'group', 'id': group.id, 'title': 'Другая',
+             'slug': 'drugaya', 'description': ''},
+            {'model': 'post', 'id': post.id, 'text': 'чужая запись',
+             'pub_date': '2020-01-01T00:00:00.000001+00:00',
+             'author': 'guest', 'group': 'drugaya', 'image': ''},
+            {'model': 'comment', 'id': 1, 'text': 'к чужой записи',
+             'created': '2020-01-02T00:00:00+00:00', 'author': 'guest',
+             'post': post.id},
+        ]
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+        before = self.snapshot()
+
+        out = StringIO()
+        call_command('import_data', path, stdout=out)
+        self.assertIn('post: прочитано 1, пропущено 0', out.getvalue())
+        imported = Post.objects.get(text='чужая запись')
+        self.assertNotEqual(imported.id, post.id)
+        self.assertEqual(imported.group.slug, 'drugaya')
+        self.assertEqual(imported.comments_count, 1)
+        self.assertEqual(
+            Comment.objects.get(text='к чужой записи').post, imported)
+        after = self.snapshot()
+        self.assertTrue(set(before['posts']) < set(after['posts']))
+        self.assertIn(('obo_vsem', 'Обо всём'), after['groups'])
+
+    def test_same_timestamp_posts_are_kept_apart(self):
+        """Записи одного автора с одним pub_date, но разным текстом
+        не сливаются; IN-списки режутся под предел параметров"""
+
+        post = Post.objects.order_by('id').first()
+        pub_date = post.pub_date.isoformat()
+        records = [{'model': 'post', 'id': num, 'text': text,
+                    'pub_date': pub_date, 'author': 'author',
+                    'group': None, 'image': ''}
+                   for num, text in enumerate([post.text, 'другая',
+                                               'третья', 'другая'])]
+        records += [{'model': 'comment', 'id': num, 'text': text,
+                     'created': pub_date, 'author': 'reader', 'post': 1}
+                    for num, text in enumerate(['раз', 'два', 'три'])]
+        path = f'{TransferTests.directory}/same.ndjson'
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+
+        out = StringIO()
+        with mock.patch.object(connection.features, 'max_query_params', 6):
+            call_command('import_data', path, stdout=out)
+        self.assertIn('post: прочитано 4, пропущено 2', out.getvalue())
+        self.assertIn('comment: прочитано 3, пропущено 0', out.getvalue())
+        same = Post.objects.filter(author=post.author, pub_date=post.pub_date)
+        self.assertEqual(sorted(same.values_list('text', flat=True)),
+                         sorted([post.text, 'другая', 'третья']))
+        self.assertEqual(Post.objects.get(text='другая').comments_count, 3)
+
+    def test_new_users_get_stats_without_rebuild(self):
+        """Пользователи, созданные загрузкой, получают UserStats и без
+        пересборки производных данных"""
+
+        path = f'{TransferTests.directory}/follow.ndjson'
+        with open(path, 'w') as file:
+            file.write(json.dumps({'model': 'follow', 'id': 1,
+                                   'user': 'newcomer',
+                                   'author': 'stranger'}) + '\n')
+        call_command('import_data', path, skip_derived=True,
+                     stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.filter(
+                user__username__in=['newcomer', 'stranger']).count(), 2)
+
+    def test_broken_line(self):
+        path = f'{TransferTests.directory}/broken.ndjson'
+        with open(path, 'w') as file:
+            file.write('{"model": "group", "id": 1}\n{oops\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            call_command('import_data', path, stdout=StringIO())
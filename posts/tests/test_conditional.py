@@ -0,0 +1,119 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Обо всём', slug='obo_vsem',
+                                         description='тестовая группа')
+        cls.other_group = Group.objects.create(title='Другая', slug='other',
+                                               description='вторая группа')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='запись', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': 'obo_vsem'}),
+            'other_group': reverse('group', kwargs={'slug': 'other'}),
+            'profile': reverse('profile', kwargs={'username': 'author'}),
+            'post': reverse('post', kwargs={
+                'username': 'author',
+                'post_id': ConditionalGetTests.post.id}),
+        }
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def assertNotChanged(self, url):
+        response = self.revalidate(url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED, url)
+
+    def test_unchanged_pages_answer_304_without_queries(self):
+        """Повторный запрос без изменений получает 304
+        и не обращается к базе"""
+
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_writes_change_validators(self):
+        checks = (
+            (('index', 'profile'), lambda: Post.objects.create(
+                text='новая', author=ConditionalGetTests.author)),
+            (('post', 'profile'), lambda: Comment.objects.create(
+                text='комментарий', author=ConditionalGetTests.reader,
+                post=ConditionalGetTests.post)),
+            (('profile',), lambda: Follow.objects.create(
+                user=ConditionalGetTests.reader,
+                author=ConditionalGetTests.author)),
+            (('group', 'other_group', 'post'), self.move_post),
+        )
+        for names, write in checks:
+            with self.subTest(names=names):
+                etags = {name: self.client.get(self.urls[name])['ETag']
+                         for name in names}
+                write()
+                for name in names:
+                    response = self.client.get(
+                        self.urls[name], HTTP_IF_NONE_MATCH=etags[name])
+                    self.assertEqual(response.status_code, HTTPStatus.OK,
+                                     name)
+
+    def test_new_etag_comes_with_new_content(self):
+        """Новый ETag главной отдаётся вместе с новой записью, а не
+        с закэшированным фрагментом"""
+
+        url = self.urls['index']
+        self.client.get(url)
+        Post.objects.create(text='свежая запись',
+                            author=ConditionalGetTests.author)
+        response = self.client.get(url)
+        self.assertContains(response, 'свежая запись')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def move_post(self):
+        post = Post.objects.get(id=ConditionalGetTests.post.id)
+        post.group = ConditionalGetTests.other_group
+        post.save()
+
+    def test_etag_depends_on_viewer(self):
+        url = self.urls['profile']
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(ConditionalGetTests.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotChanged(url)
+
+    def test_post_etag_depends_on_csrf_cookie(self):
+        """Страница с формой комментария не отдаёт 304 после смены
+        CSRF-токена, например после нового входа"""
+
+        url = self.urls['post']
+        self.client.force_login(ConditionalGetTests.reader)
+        self.client.get(url)
+        self.assertIn('csrftoken', self.client.cookies)
+        self.assertNotChanged(url)
+
+        etag = self.client.get(url)['ETag']
+        self.client.cookies['csrftoken'] = 'x' * 64
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'csrfmiddlewaretoken')
@@ -0,0 +1,72 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Group, Post, User
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Обо всём', slug='obo_vsem',
+                                         description='тестовая группа')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        Post.objects.create(text='запись в группе', author=cls.author,
+                            group=cls.group)
+        Post.objects.create(text='запись без группы', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_list_scope_posts(self):
+        """Ленты группы и автора содержат только свои записи"""
+
+        cases = (
+            ('index_rss', {}, 'application/rss+xml',
+             ['запись в группе', 'запись без группы']),
+            ('group_atom', {'slug': 'obo_vsem'}, 'application/atom+xml',
+             ['запись в группе']),
+            ('profile_rss', {'username': 'other'}, 'application/rss+xml',
+             ['запись без группы']),
+        )
+        for name, kwargs, content_type, texts in cases:
+            with self.subTest(feed=name):
+                response = self.client.get(reverse(name, kwargs=kwargs))
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                content = response.content.decode()
+                for text in ('запись в группе', 'запись без группы'):
+                    self.assertEqual(text in content, text in texts)
+
+        response = self.client.get(reverse('group_rss',
+                                           kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_polls_do_not_touch_database(self):
+        """Повторные опросы отвечают из кэша без запросов к базе,
+        новая запись попадает в ленту"""
+
+        url = reverse('group_rss', kwargs={'slug': 'obo_vsem'})
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            again = self.client.get(url)
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+
+        Post.objects.create(text='свежая запись', author=FeedTests.author,
+                            group=FeedTests.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('свежая запись', response.content.decode())
+
+    def test_pages_link_their_feeds(self):
+        response = self.client.get(reverse('profile',
+                                           kwargs={'username': 'author'}))
+        self.assertContains(response, reverse('profile_atom', kwargs={
+            'username': 'author'}))
@@ -3,9 +3,10 @@ import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.models import Comment, Group, Post, User
+from posts.storage import content_addressed
 
 
 class CreateFromFormTests(TestCase):
@@ -13,7 +14,8 @@ class CreateFromFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
         cls.group = Group.objects.create(
             title='Обо всём',
             slug='obo_vsem',
@@ -32,6 +34,7 @@ class CreateFromFormTests(TestCase):
     @classmethod
     def tearDownClass(cls):
         shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
         super().tearDownClass()
 
     def test_post_create_fr_web_form(self):
@@ -72,8 +75,10 @@ class CreateFromFormTests(TestCase):
                          'Пост сохранился с неправильной группой')
         self.assertEqual(post.author, CreateFromFormTests.user,
                          'Пост сохранился с неправильным автором')
-        self.assertIn(uploaded.name, str(post.image),
-                      'Изображение не сохранилось')
+        self.assertTrue(post.image.storage.exists(post.image.name),
+                        'Изображение не сохранилось')
+        self.assertTrue(content_addressed(post.image.name),
+                        'Изображение сохранилось не под именем по содержимому')
 
     def test_post_edit_fr_web_form(self):
         """Проверка, что данные из формы
@@ -163,3 +168,18 @@ class CreateFromFormTests(TestCase):
             amount_before,
             amount_after,
             'Неавторизованный пользователь смог добавить комментарий')
+
+    def test_signup_rejects_route_names(self):
+        """Имя пользователя не может совпадать с адресом страницы сайта"""
+
+        form = {'username': 'rss', 'password1': 'Zx12-cv34-Bn56',
+                'password2': 'Zx12-cv34-Bn56'}
+        for username in ('rss', 'atom', 'search', 'follow', 'new'):
+            with self.subTest(username=username):
+                form['username'] = username
+                response = self.guest_client.post(reverse('signup'), form)
+                self.assertFormError(response, 'form', 'username',
+                                     'Это имя занято адресом сайта')
+        form['username'] = 'rss_reader'
+        self.guest_client.post(reverse('signup'), form)
+        self.assertTrue(User.objects.filter(username='rss_reader').exists())
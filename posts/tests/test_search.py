@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import search
+from posts.models import Comment, Post, User
+from yatube.settings import POSTS_ON_PAGE
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.cats = Post.objects.create(
+            text='Котики котики и ещё раз котики', author=cls.author)
+        cls.dogs = Post.objects.create(
+            text='Собаки и немного котики', author=cls.author)
+        cls.weather = Post.objects.create(
+            text='Погода сегодня', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        return [post.id for post in response.context['page']]
+
+    def test_ranked_results(self):
+        """Поиск находит записи и ставит самые релевантные первыми"""
+
+        self.assertEqual(self.found('котики'),
+                         [SearchTests.cats.id, SearchTests.dogs.id])
+        self.assertEqual(self.found('СОБАКИ котики'), [SearchTests.dogs.id])
+        self.assertEqual(self.found('кролики'), [])
+
+    def test_comments_are_searched(self):
+        """Запись находится по тексту комментария к ней"""
+
+        Comment.objects.create(text='прогноз на завтра', author=self.author,
+                               post=SearchTests.weather)
+        self.assertEqual(self.found('прогноз'), [SearchTests.weather.id])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении записей"""
+
+        post = Post.objects.create(text='черновик', author=self.author)
+        self.assertEqual(self.found('черновик'), [post.id])
+        post.text = 'чистовик'
+        post.save()
+        self.assertEqual(self.found('черновик'), [])
+        self.assertEqual(self.found('чистовик'), [post.id])
+        comment = Comment.objects.create(text='замечание', post=post,
+                                         author=self.author)
+        comment.delete()
+        self.assertEqual(self.found('замечание'), [])
+        post.delete()
+        self.assertEqual(self.found('чистовик'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+
+        for query in ('"котики', 'котики AND (', 'NEAR(', '*', ''):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('search'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос"""
+
+        Post.objects.bulk_create(
+            Post(text=f'новости {num}', author=self.author)
+            for num in range(POSTS_ON_PAGE + 2))
+        response = self.client.get(reverse('search'), {'q': 'новости'})
+        self.assertEqual(response.context['page'].paginator.count,
+                         POSTS_ON_PAGE + 2)
+        self.assertContains(response, '?q=%D0%BD%D0%BE%D0%B2%D0%BE%D1%81'
+                                      '%D1%82%D0%B8&amp;page=2')
+        response = self.client.get(reverse('search'),
+                                   {'q': 'новости', 'page': 2})
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу"""
+
+        self.client.force_login(SearchTests.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котики'})
+        self.assertEqual(
+            {post.id for post in response.context['cl'].result_list},
+            {SearchTests.cats.id, SearchTests.dogs.id})
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс после рассинхронизации"""
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE} WHERE rowid = %s',
+                           [SearchTests.weather.id])
+            cursor.execute(
+                f'INSERT INTO {search.TABLE} (rowid, text, post_id) '
+                f'VALUES (%s, %s, %s)', [10 ** 6, 'призрак', 10 ** 6])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(self.found('погода'), [SearchTests.weather.id])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE} '
+                           f'WHERE {search.TABLE} MATCH %s', ['призрак'])
+            self.assertEqual(cursor.fetchone()[0], 0)
@@ -0,0 +1,103 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.bulk import id_batches
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='запись', author=cls.author)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с записями, комментариями
+        и подписками"""
+
+        author = CountersTests.author
+        reader = CountersTests.reader
+        self.assertEqual(self.stats(author).posts_count, 1)
+
+        comment = Comment.objects.create(text='комментарий', author=reader,
+                                         post=CountersTests.post)
+        follow = Follow.objects.create(user=reader, author=author)
+        CountersTests.post.refresh_from_db()
+        self.assertEqual(CountersTests.post.comments_count, 1)
+        self.assertEqual(self.stats(author).followers_count, 1)
+        self.assertEqual(self.stats(reader).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        Post.objects.create(text='ещё запись', author=author)
+        CountersTests.post.refresh_from_db()
+        self.assertEqual(CountersTests.post.comments_count, 0)
+        self.assertEqual(self.stats(author).followers_count, 0)
+        self.assertEqual(self.stats(reader).following_count, 0)
+        self.assertEqual(self.stats(author).posts_count, 2)
+
+    def test_profile_shows_counters(self):
+        Follow.objects.create(user=CountersTests.reader,
+                              author=CountersTests.author)
+        response = Client().get(reverse(
+            'profile', kwargs={'username': CountersTests.author.username}))
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Всего записей: 1')
+
+    def test_recount_repairs_drift(self):
+        UserStats.objects.filter(user=CountersTests.author).update(
+            posts_count=40, followers_count=3)
+        UserStats.objects.filter(user=CountersTests.reader).delete()
+        Post.objects.filter(id=CountersTests.post.id).update(
+            comments_count=7)
+        out = StringIO()
+        call_command('recount_stats', batch_size=1, stdout=out)
+
+        author_stats = self.stats(CountersTests.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertTrue(UserStats.objects.filter(
+            user=CountersTests.reader).exists())
+        CountersTests.post.refresh_from_db()
+        self.assertEqual(CountersTests.post.comments_count, 0)
+        self.assertIn('пользователей: 2, записей: 1', out.getvalue())
+
+    def test_recount_counts_every_row(self):
+        """Пересчёт учитывает все записи автора и все комментарии
+        записи, а не одну строку группы"""
+
+        author = CountersTests.author
+        posts = [Post.objects.create(text=f'запись {num}', author=author)
+                 for num in range(3)]
+        for num in range(2):
+            Comment.objects.create(text=f'комментарий {num}',
+                                   author=CountersTests.reader,
+                                   post=posts[0])
+        UserStats.objects.filter(user=author).update(posts_count=0)
+        Post.objects.filter(id=posts[0].id).update(comments_count=0)
+        call_command('recount_stats', stdout=StringIO())
+
+        self.assertEqual(self.stats(author).posts_count, 4)
+        posts[0].refresh_from_db()
+        self.assertEqual(posts[0].comments_count, 2)
+
+    def test_batches_fit_query_params(self):
+        """Пачки id не превышают число параметров одного запроса"""
+
+        User.objects.bulk_create(
+            [User(username=f'bulk_{num}') for num in range(3)])
+        with mock.patch.object(connection.features, 'max_query_params', 2):
+            sizes = [len(ids)
+                     for ids in id_batches(User.objects.all(), 1000)]
+            call_command('recount_stats', batch_size=1000, stdout=StringIO())
+        self.assertEqual(sizes, [2, 2, 1])
+        self.assertEqual(UserStats.objects.count(), 5)
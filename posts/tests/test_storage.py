@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from itertools import count
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import storage, thumbnails
+from posts.models import Post, User
+from sorl.thumbnail import default
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+COLORS = count()
+
+
+def png(name, color=None):
+    content = BytesIO()
+    if color is None:
+        shade = next(COLORS)
+        color = (10, shade % 256, shade // 256)
+    Image.new('RGB', (64, 48), color).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+def run_on_commit(callback):
+    callback()
+
+
+# Записи KVStore хранят путь к классу хранилища, а не экземпляр:
+# MEDIA_ROOT меняется через override_settings, чтобы новые экземпляры
+# смотрели в тот же каталог.
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   CONTENT_RELEASE_GRACE=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.local.clear()
+        shutil.rmtree(default_storage.path('posts'), ignore_errors=True)
+        self.client = Client()
+        self.client.force_login(ContentAddressedStorageTests.user)
+
+    def test_identical_uploads_are_stored_once(self):
+        """Одинаковые загрузки получают одно имя по содержимому"""
+
+        for name in ('meme.png', 'копия.PNG'):
+            self.client.post(reverse('new_post'), {
+                'text': name, 'image': png(name, (1, 2, 3))})
+        self.client.post(reverse('new_post'),
+                         {'text': 'другое', 'image': png('other.png', 'red')})
+        first, second, other = (
+            Post.objects.get(text=text).image.name
+            for text in ('meme.png', 'копия.PNG', 'другое'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(storage.content_addressed(first))
+        self.assertTrue(first.endswith('.png'))
+        self.assertEqual(
+            len(list(storage.stored_files(default_storage, 'posts'))), 2)
+
+    def test_thumbnails_are_shared(self):
+        """Миниатюры строятся по имени файла и общие для записей"""
+
+        name = default_storage.save('posts/a.png', png('a.png', 'olive'))
+        thumbnails.build(name)
+        with mock.patch.object(thumbnails.ThumbnailBackend,
+                               '_create_thumbnail') as create:
+            self.assertEqual(default_storage.save(
+                'posts/b.png', png('b.png', 'olive')), name)
+            thumbnails.build(name)
+        create.assert_not_called()
+
+    def test_last_reference_releases_file(self):
+        """Файл и миниатюры удаляются вместе с последней записью"""
+
+        posts = [Post.objects.create(text=f'пост {num}',
+                                     author=ContentAddressedStorageTests.user,
+                                     image=png(f'{num}.png', 'navy'))
+                 for num in range(2)]
+        name = posts[0].image.name
+        thumbnails.build(name)
+        thumbnail = thumbnails.thumbnail_files(name)[0]
+        self.assertTrue(default_storage.exists(thumbnail.name))
+        with mock.patch('posts.signals.transaction.on_commit',
+                        run_on_commit):
+            posts[0].delete()
+            self.assertTrue(default_storage.exists(name))
+            posts[1].image = png('new.png', 'green')
+            posts[1].save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertTrue(default_storage.exists(posts[1].image.name))
+
+    @override_settings(CONTENT_RELEASE_GRACE=60)
+    def test_recent_upload_is_kept(self):
+        """Недавно загруженный повторно файл не удаляется"""
+
+        name = default_storage.save('posts/a.png', png('a.png'))
+        self.assertFalse(thumbnails.discard(name))
+        self.assertTrue(default_storage.exists(name))
+
+    @override_settings(CONTENT_RELEASE_GRACE=60)
+    def test_recent_release_is_rechecked(self):
+        """Файл, освобождённый в пределах grace, проверяется ещё раз
+        и удаляется, когда grace истечёт"""
+
+        post = Post.objects.create(text='пост',
+                                   author=ContentAddressedStorageTests.user,
+                                   image=png('a.png'))
+        name = post.image.name
+        with mock.patch('posts.signals.transaction.on_commit',
+                        run_on_commit), \
+                mock.patch('posts.thumbnails.threading.Timer') as timer:
+            post.delete()
+        self.assertTrue(default_storage.exists(name))
+        delay, recheck = timer.call_args[0]
+        self.assertTrue(0 < delay <= 60)
+        timer.return_value.start.assert_called_once()
+        with override_settings(CONTENT_RELEASE_GRACE=0), \
+                mock.patch('posts.thumbnails.connection'):
+            recheck()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_dedupe_command(self):
+        """Команда переносит старые файлы под имена по содержимому
+        и склеивает дубли"""
+
+        legacy = {}
+        for name, color in (('a.png', 'red'), ('b.png', 'red'),
+                            ('c.png', 'blue')):
+            path = default_storage.path(f'posts/{name}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(png(name, color).read())
+            legacy[name] = Post.objects.create(
+                text=name, author=ContentAddressedStorageTests.user,
+                image=f'posts/{name}')
+        orphan = default_storage.save('posts/orphan.png',
+                                      png('orphan.png', 'green'))
+        out = StringIO()
+        call_command('dedupe_images', stdout=out)
+        self.assertIn('перенесено: 3, из них дублей: 1, удалено без '
+                      'ссылок: 1', out.getvalue())
+
+        names = {name: Post.objects.get(pk=post.pk).image.name
+                 for name, post in legacy.items()}
+        self.assertEqual(names['a.png'], names['b.png'])
+        self.assertNotEqual(names['a.png'], names['c.png'])
+        self.assertEqual(
+            sorted(storage.stored_files(default_storage, 'posts')),
+            sorted({names['a.png'], names['c.png']}))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(
+            thumbnails.derivative_file(names['c.png'], 'WEBP').exists())
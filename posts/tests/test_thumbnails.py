@@ -0,0 +1,282 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from itertools import count
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from posts import thumbnails, timeline
+from posts.models import Follow, Post, User
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+
+SHIFTS = count()
+
+
+def jpeg(name='photo.jpg', size=(640, 360)):
+    # Изображения хранятся по содержимому: каждому файлу свой размер.
+    content = BytesIO()
+    width, height = size
+    Image.new('RGB', (width + next(SHIFTS), height), (200, 30, 30)).save(
+        content, 'JPEG')
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/jpeg')
+
+
+def run_on_commit(callback):
+    callback()
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ThumbnailTests.user)
+
+    def image_sources(self, post):
+        response = self.client.get(reverse('profile', kwargs={
+            'username': ThumbnailTests.user.username}))
+        return [src for src in response.content.decode().split('src="')[1:]
+                if post.image.name.split('/')[-1].split('.')[0] in src
+                or 'cache/' in src]
+
+    def test_pages_fall_back_to_original(self):
+        """Пока миниатюры не готовы, страница показывает оригинал
+        и не строит их сама"""
+
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        with mock.patch.object(thumbnails.ThumbnailBackend,
+                               'get_thumbnail') as build:
+            sources = self.image_sources(post)
+        build.assert_not_called()
+        self.assertTrue(sources[0].startswith(post.image.url))
+
+    def test_upload_builds_all_geometries(self):
+        """Сохранение изображения строит миниатюры всех размеров"""
+
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        run_on_commit):
+            self.client.post(reverse('new_post'),
+                             {'text': 'фото', 'image': jpeg()})
+        post = Post.objects.get(text='фото')
+        sources = self.image_sources(post)
+        self.assertIn('cache/', sources[0])
+        backend = thumbnails.DeferredThumbnailBackend()
+        for geometry, options in settings.POST_THUMBNAILS:
+            with self.subTest(geometry=geometry):
+                thumbnail = backend.get_thumbnail(post.image, geometry,
+                                                  **options)
+                self.assertEqual(
+                    '{}x{}'.format(*thumbnail.size), geometry)
+
+    def test_built_thumbnails_change_page_versions(self):
+        """Готовые миниатюры меняют ETag страниц и ключ кэша ленты
+        подписок, иначе страницы ещё долго показывали бы оригинал"""
+
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=ThumbnailTests.user)
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        url = reverse('profile', kwargs={
+            'username': ThumbnailTests.user.username})
+        etag = self.client.get(url)['ETag']
+        feed = timeline.feed_version(reader, [])
+
+        thumbnails.build(post.image.name)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cache/', self.image_sources(post)[0])
+        self.assertGreater(timeline.feed_version(reader, []), feed)
+
+    def test_jobs_are_deduplicated(self):
+        """Миниатюры одного изображения ставятся в очередь один раз"""
+
+        first = default_storage.save('posts/a.jpg', jpeg())
+        second = default_storage.save('posts/b.jpg', jpeg())
+        with mock.patch('posts.thumbnails.build') as build:
+            self.assertTrue(thumbnails.schedule(first))
+            self.assertFalse(thumbnails.schedule(first))
+            self.assertTrue(thumbnails.schedule(second))
+            self.assertFalse(thumbnails.schedule('posts/missing.jpg'))
+        self.assertEqual(build.call_count, 2)
+
+    def test_edit_without_new_image_does_not_schedule(self):
+        """Правка текста не ставит миниатюры в очередь заново"""
+
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        with mock.patch('posts.thumbnails.schedule_on_commit') as schedule:
+            post.text = 'другое'
+            post.save()
+            post.save(update_fields=['text'])
+        schedule.assert_not_called()
+
+    def test_build_thumbnails_command(self):
+        """Команда строит миниатюры существующих записей"""
+
+        for num in range(3):
+            Post.objects.create(text=f'фото {num}',
+                                author=ThumbnailTests.user,
+                                image=jpeg(f'photo{num}.jpg'))
+        out = StringIO()
+        call_command('build_thumbnails', workers=0, batch_size=2, stdout=out)
+        self.assertIn('обработано: 3', out.getvalue())
+        post = Post.objects.first()
+        self.assertIn('cache/', self.image_sources(post)[0])
+
+    def test_page_thumbnails_are_prefetched(self):
+        """Записи KVStore о миниатюрах страницы читаются одним запросом,
+        повторный показ обходится без кэша и базы"""
+
+        for num in range(5):
+            Post.objects.create(text=f'фото {num}',
+                                author=ThumbnailTests.user,
+                                image=jpeg(f'page{num}.jpg'))
+        call_command('build_thumbnails', workers=0, stdout=StringIO())
+        cache.clear()
+        default.kvstore.local.clear()
+        url = reverse('profile', kwargs={
+            'username': ThumbnailTests.user.username})
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        kvstore_queries = [query for query in captured
+                           if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+        steps = len(thumbnails.ladder('960x339'))
+        self.assertEqual(
+            response.content.decode().count('/cache/'),
+            5 * (1 + steps * (1 + len(settings.POST_IMAGE_FORMATS))))
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url)
+        self.assertFalse([query for query in captured
+                          if 'thumbnail_kvstore' in query['sql']])
+
+    def test_changed_image_is_evicted(self):
+        """Смена изображения убирает старые записи из LRU процесса"""
+
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        thumbnails.build(post.image.name)
+        old = [add_prefix(thumbnail.key) for thumbnail
+               in thumbnails.thumbnail_files(post.image.name)]
+        self.assertTrue(all(default.kvstore.local.get(key) for key in old))
+        post.image = jpeg('other.jpg')
+        post.save()
+        self.assertFalse(any(default.kvstore.local.get(key) for key in old))
+
+    def test_webp_sources(self):
+        """Для миниатюр и оригинала строятся копии в WebP,
+        страница отдаёт их в <source>"""
+
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        thumbnails.build(post.image.name)
+        derivative = thumbnails.derivative_file(post.image.name, 'WEBP')
+        self.assertTrue(derivative.exists())
+        self.assertTrue(derivative.name.endswith('.webp'))
+        with default_storage.open(derivative.name) as file:
+            self.assertEqual(Image.open(file).format, 'WEBP')
+
+        content = self.client.get(reverse('profile', kwargs={
+            'username': ThumbnailTests.user.username})).content.decode()
+        self.assertRegex(content, r'<source srcset="[^"]*/cache/[^"]*\.webp '
+                                  r'\d+w[^"]*" sizes="[^"]+"'
+                                  r' type="image/webp">')
+
+        picture = thumbnails.picture(post.image, '960x339')
+        self.assertEqual(len(picture['sources']), 1)
+        with mock.patch.object(thumbnails.DeferredThumbnailBackend,
+                               'ready_thumbnail', return_value=None):
+            picture = thumbnails.picture(post.image, '960x339')
+        self.assertEqual(picture['src'], post.image.url)
+        self.assertEqual(picture['sources'][0]['srcset'], derivative.url)
+        self.assertEqual(picture['srcset'], '')
+
+    @override_settings(POST_IMAGE_WIDTHS=(200, 480, 1200, 5000))
+    def test_srcset_ladder(self):
+        """Для srcset заранее строится лестница ширин с пропорциями
+        миниатюры; страница получает её вместе с sizes"""
+
+        self.assertEqual(thumbnails.ladder('960x339'), [
+            (200, '200x71'), (480, '480x170'), (960, '960x339'),
+            (1200, '1200x424')])
+        post = Post.objects.create(text='фото', author=ThumbnailTests.user,
+                                   image=jpeg())
+        thumbnails.build(post.image.name)
+        picture = thumbnails.picture(post.image, '960x339')
+        widths = [candidate.split()[-1]
+                  for candidate in picture['srcset'].split(', ')]
+        self.assertEqual(widths, ['200w', '480w', '960w', '1200w'])
+        backend = thumbnails.DeferredThumbnailBackend()
+        for width, geometry in thumbnails.ladder('960x339'):
+            with self.subTest(geometry=geometry):
+                thumbnail = backend.get_thumbnail(post.image, geometry,
+                                                  crop='center', upscale=True)
+                self.assertEqual(thumbnail.width, width)
+
+        content = self.client.get(
+            reverse('post', kwargs={'username': ThumbnailTests.user.username,
+                                    'post_id': post.id})).content.decode()
+        self.assertIn(f'srcset="{picture["srcset"]}" sizes="(min-width: ',
+                      content)
+
+    def test_scan_media_backfill(self):
+        """Команда обрабатывает все файлы каталога posts/ в MEDIA_ROOT"""
+
+        names = [default_storage.save(f'posts/old{num}.jpg', jpeg())
+                 for num in range(3)]
+        out = StringIO()
+        call_command('build_thumbnails', workers=0, scan_media=True,
+                     stdout=out)
+        self.assertIn('с ошибками: 0', out.getvalue())
+        for name in names:
+            self.assertTrue(
+                thumbnails.derivative_file(name, 'WEBP').exists())
+
+
+@override_settings(THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTests(SimpleTestCase):
+    def tearDown(self):
+        if thumbnails._pool is not None:
+            thumbnails._pool.shutdown()
+            thumbnails._pool = None
+
+    def test_pool_worker_starts_django(self):
+        """Процесс пула настраивает Django до загрузки posts.thumbnails
+        и считает те же имена миниатюр"""
+
+        backend = thumbnails.DeferredThumbnailBackend()
+        source = ImageFile('posts/photo.jpg')
+        future = thumbnails._get_pool().submit(
+            backend.thumbnail_file, source, '960x339', {})
+        self.assertEqual(future.result(timeout=60).name,
+                         backend.thumbnail_file(source, '960x339', {}).name)
@@ -0,0 +1,200 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Follow, Post, TimelineEntry, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(text='старая запись',
+                                           author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTests.reader)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит посты автора в ленту,
+        отписка убирает их"""
+
+        self.reader_client.get(reverse(
+            'profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(self.feed(), [TimelineTests.old_post])
+
+        self.reader_client.get(reverse(
+            'profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        new = Post.objects.create(text='новая', author=TimelineTests.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelineTests.reader, post=new).exists())
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_without_fan_out(self):
+        """Посты авторов с большим числом подписчиков
+        не раскладываются, но видны в ленте"""
+
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        new = Post.objects.create(text='новая', author=TimelineTests.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_demoted_author_is_refilled(self):
+        """Когда подписчиков становится не больше лимита, посты,
+        вышедшие без раскладки, попадают в ленты подписчиков"""
+
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=TimelineTests.author)
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        new = Post.objects.create(text='новая', author=TimelineTests.author)
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=TimelineTests.reader)
+                .values_list('post_id', flat=True)),
+            {new.id, TimelineTests.old_post.id})
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+        Follow.objects.create(user=other, author=TimelineTests.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_timeline_cursor_mode(self):
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        new = Post.objects.create(text='новая', author=TimelineTests.author)
+        self.assertEqual(self.feed(), [new, TimelineTests.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_mixed_feed_pages(self):
+        """Лента с подмешанными постами листается в общем порядке
+        и по номерам страниц, и по курсору"""
+
+        celebrity = User.objects.create_user(username='celebrity')
+        fan = User.objects.create_user(username='fan')
+        for user in (TimelineTests.reader, fan):
+            Follow.objects.create(user=user, author=celebrity)
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        for num in range(13):
+            Post.objects.create(text=f'запись {num}',
+                                author=(celebrity, self.author)[num % 2])
+        self.assertFalse(TimelineEntry.objects.filter(author=celebrity))
+        expected = list(Post.objects.filter(
+            author__in=[celebrity, TimelineTests.author]
+        ).order_by('-pub_date', '-id'))
+
+        pages = [self.reader_client.get(reverse('follow_index'),
+                                        {'page': number}).context['page']
+                 for number in (1, 2)]
+        self.assertEqual([post for page in pages for post in page], expected)
+
+        feed, params = [], {'after': ''}
+        with override_settings(CURSOR_PAGINATION=True):
+            while params['after'] is not None:
+                page = self.reader_client.get(
+                    reverse('follow_index'),
+                    params if params['after'] else {}).context['page']
+                feed.extend(page)
+                params = {'after': page.next_cursor}
+        self.assertEqual(feed, expected)
+
+        previous = self.reader_client.get(reverse('follow_index'), {
+            'before': page.previous_cursor}).context['page']
+        self.assertEqual(list(previous), expected[:10])
+
+    @override_settings(TIMELINE_BACKFILL_LIMIT=10)
+    def test_posts_older_than_backfill_are_merged(self):
+        """Посты автора старше TIMELINE_BACKFILL_LIMIT не раскладываются,
+        но лента листается до самого старого"""
+
+        for num in range(30):
+            Post.objects.create(text=f'запись {num}',
+                                author=TimelineTests.author)
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        Post.objects.create(text='после подписки',
+                            author=TimelineTests.author)
+        self.assertEqual(TimelineEntry.objects.count(), 11)
+        expected = list(Post.objects.filter(author=TimelineTests.author)
+                        .order_by('-pub_date', '-id'))
+
+        feed = []
+        for number in range(1, 5):
+            feed.extend(self.reader_client.get(
+                reverse('follow_index'), {'page': number}).context['page'])
+        self.assertEqual(feed, expected)
+
+        feed, params = [], {}
+        with override_settings(CURSOR_PAGINATION=True):
+            while params.get('after', '') is not None:
+                page = self.reader_client.get(
+                    reverse('follow_index'), params).context['page']
+                feed.extend(page)
+                params = {'after': page.next_cursor}
+        self.assertEqual(feed, expected)
+
+
+class FollowPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other_reader')
+        Post.objects.create(text='запись автора', author=cls.author)
+        Post.objects.create(text='запись другого', author=cls.other_author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.other_reader, author=cls.other_author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_feed(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.get(reverse('follow_index')).content.decode()
+
+    def test_feed_fragment_is_cached_per_user(self):
+        """Пользователи не видят закэшированные ленты друг друга"""
+
+        self.assertIn('запись автора',
+                      self.get_feed(FollowPageCacheTests.reader))
+        other_feed = self.get_feed(FollowPageCacheTests.other_reader)
+        self.assertIn('запись другого', other_feed)
+        self.assertNotIn('запись автора', other_feed)
+
+    def test_new_post_invalidates_followers_feed(self):
+        self.get_feed(FollowPageCacheTests.reader)
+        Post.objects.create(text='свежая запись',
+                            author=FollowPageCacheTests.author)
+        self.assertIn('свежая запись',
+                      self.get_feed(FollowPageCacheTests.reader))
+
+    def test_follow_invalidates_feed(self):
+        self.get_feed(FollowPageCacheTests.reader)
+        Follow.objects.create(user=FollowPageCacheTests.reader,
+                              author=FollowPageCacheTests.other_author)
+        self.assertIn('запись другого',
+                      self.get_feed(FollowPageCacheTests.reader))
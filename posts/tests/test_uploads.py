@@ -0,0 +1,114 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import uploads
+from posts.models import Post, User
+
+
+def image_file(name, size, image_format='PNG', **options):
+    content = BytesIO()
+    Image.new('RGB', size, (10, 120, 200)).save(content, image_format,
+                                                **options)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+def mpo_file(name):
+    """Многокадровый JPEG, как у снимков с телефона."""
+    frames = [Image.new('RGB', (10, 10), color) for color in ('red', 'blue')]
+    content = BytesIO()
+    frames[0].save(content, 'MPO', save_all=True, append_images=frames[1:])
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+class UploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(UploadTests.user)
+
+    def upload(self, image):
+        return self.client.post(reverse('new_post'),
+                                {'text': 'фото', 'image': image})
+
+    def test_upload_goes_to_disk(self):
+        """Загрузка пишется во временный файл, а не в память"""
+
+        with mock.patch('posts.forms.validate_upload') as validate:
+            self.upload(image_file('small.png', (10, 10)))
+        uploaded = validate.call_args[0][0]
+        self.assertTrue(hasattr(uploaded, 'temporary_file_path'))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_byte_limit(self):
+        response = self.upload(image_file('big.bmp', (200, 200), 'BMP'))
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_pixel_limit_checked_from_header(self):
+        """Лимит пикселей проверяется без декодирования изображения"""
+
+        image = image_file('wide.png', (200, 100))
+        with mock.patch.object(Image.Image, 'load') as load:
+            response = self.upload(image)
+        load.assert_not_called()
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение 200×100 слишком большое.')
+
+    def test_unsupported_format(self):
+        response = self.upload(image_file('image.bmp', (10, 10), 'BMP'))
+        self.assertFormError(response, 'form', 'image',
+                             'Формат BMP не поддерживается.')
+
+    def test_mpo_is_accepted_as_jpeg(self):
+        """Снимок MPO с телефона принимается как JPEG"""
+
+        image = mpo_file('phone.jpg')
+        self.assertEqual(uploads.probe(image)[0], 'JPEG')
+        self.upload(image)
+        self.assertTrue(Post.objects.filter(image__endswith='.jpg').exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_normalize_rotates_and_downscales(self):
+        """Оригинал поворачивается по EXIF и уменьшается вне запроса"""
+
+        exif = Image.Exif()
+        exif[uploads.EXIF_ORIENTATION] = 6
+        name = default_storage.save('posts/rotated.jpg', image_file(
+            'rotated.jpg', (400, 200), 'JPEG', exif=exif.tobytes()))
+        self.assertTrue(uploads.normalize(name))
+        with default_storage.open(name) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(
+                image.getexif().get(uploads.EXIF_ORIENTATION, 1), 1)
+        self.assertFalse(uploads.normalize(name))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=5)
+    def test_normalize_saves_mpo_as_jpeg(self):
+        name = default_storage.save('posts/phone.jpg',
+                                    mpo_file('phone.jpg'))
+        self.assertTrue(uploads.normalize(name))
+        with default_storage.open(name) as file, Image.open(file) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (5, 5))
@@ -1,3 +1,5 @@
+import base64
+import re
 import shutil
 import tempfile
 
@@ -5,17 +7,25 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginator import decode_cursor, encode_cursor
 from yatube.settings import POSTS_ON_PAGE
 
+# Обход таблицы без индекса; обход по индексу (ORDER BY ... LIMIT,
+# COUNT(*) по покрывающему индексу) допустим.
+FULL_SCAN = re.compile(r'SCAN (?!.* USING (COVERING )?INDEX )')
+
 
 class PageTemplateTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media.enable()
         cls.group_base = Group.objects.create(
             title='Обо всём',
             slug='obo_vsem',
@@ -56,6 +66,7 @@ class PageTemplateTests(TestCase):
     @classmethod
     def tearDownClass(cls):
         shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
         super().tearDownClass()
 
     def compare_w_base(self, context):
@@ -263,3 +274,156 @@ class PaginatorViewsTest(TestCase):
         response = PaginatorViewsTest.client.get(reverse('index') + '?page=2')
         page_content = response.context.get('page').object_list
         self.assertEqual(len(page_content), 3)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+        for num in range(1, 14):
+            text = f'Тестовая запись № {num}.'
+            Post.objects.create(text=text, author=cls.user)
+        same_date = Post.objects.order_by('id')[5].pub_date
+        Post.objects.filter(id__in=Post.objects.order_by('id')
+                            .values('id')[3:8]).update(pub_date=same_date)
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_cursor_token_roundtrip(self):
+        post = CursorPaginatorViewsTest.expected[0]
+        self.assertEqual(decode_cursor(encode_cursor(post)),
+                         (post.pub_date, post.id))
+        self.assertIsNone(decode_cursor('мусор'))
+
+        huge = base64.urlsafe_b64encode(
+            f'{post.pub_date.isoformat()}|{2 ** 64}'.encode()).decode()
+        self.assertIsNone(decode_cursor(huge))
+        response = self.client.get(reverse('index'), {'after': huge})
+        self.assertEqual(response.status_code, 200)
+
+    def test_after_and_before_walk_whole_feed(self):
+        """Курсоры ?after=/?before= обходят ленту без пропусков
+        и повторов, в том числе при одинаковой дате публикации"""
+
+        url = reverse('index')
+        expected = CursorPaginatorViewsTest.expected
+        with override_settings(CURSOR_PAGINATION=True):
+            first = self.client.get(url).context['page']
+            self.assertEqual(list(first), expected[:10])
+            self.assertFalse(first.has_previous())
+            second = self.client.get(
+                url, {'after': first.next_cursor}).context['page']
+        self.assertEqual(list(second), expected[10:])
+        self.assertFalse(second.has_next())
+        back = self.client.get(
+            url, {'before': second.previous_cursor}).context['page']
+        self.assertEqual(list(back), expected[:10])
+
+    def test_page_urls_still_work_in_cursor_mode(self):
+        with override_settings(CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('index') + '?page=2')
+        page_content = response.context.get('page').object_list
+        self.assertEqual(len(page_content), 3)
+
+    def test_paginator_links_use_cursor(self):
+        response = self.client.get(reverse('profile', kwargs={
+            'username': CursorPaginatorViewsTest.user.username}),
+            {'after': 'мусор'})
+        page = response.context['page']
+        self.assertContains(response, f'?after={page.next_cursor}')
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Обо всём', slug='obo_vsem',
+                                         description='тестовая группа')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author{num}')
+                       for num in range(3)]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = cls.add_posts(1)[0]
+
+    @classmethod
+    def add_posts(cls, amount):
+        posts = []
+        for num in range(amount):
+            author = cls.authors[num % len(cls.authors)]
+            post = Post.objects.create(text=f'запись {num}', author=author,
+                                       group=cls.group)
+            Comment.objects.create(text='комментарий', author=author,
+                                   post=post)
+            posts.append(post)
+        return posts
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(FeedQueriesTest.reader)
+
+    def feed_urls(self):
+        post = FeedQueriesTest.post
+        return (
+            reverse('index'),
+            reverse('group', kwargs={'slug': FeedQueriesTest.group.slug}),
+            reverse('profile', kwargs={'username': post.author.username}),
+            reverse('follow_index'),
+            reverse('post', kwargs={'username': post.author.username,
+                                    'post_id': post.id}),
+        )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        """Число запросов страницы не зависит от количества
+        постов и комментариев на ней"""
+
+        post = FeedQueriesTest.post
+        urls = self.feed_urls()
+        before = {url: self.count_queries(url) for url in urls}
+        FeedQueriesTest.add_posts(POSTS_ON_PAGE * 3)
+        for num in range(5):
+            Comment.objects.create(text='ещё', post=post,
+                                   author=FeedQueriesTest.authors[num % 3])
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+    def query_plans(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                    plans[query['sql']] = [row[-1] for row in cursor]
+        return plans
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не читают таблицы целиком и не сортируют
+        во временном B-дереве"""
+
+        FeedQueriesTest.add_posts(POSTS_ON_PAGE * 2)
+        for cursor_pagination in (False, True):
+            # При нулевом лимите посты всех авторов подмешиваются
+            # в ленту подписок при чтении.
+            for fanout_limit in (settings.TIMELINE_FANOUT_LIMIT, 0):
+                with override_settings(CURSOR_PAGINATION=cursor_pagination,
+                                       TIMELINE_FANOUT_LIMIT=fanout_limit):
+                    for url in self.feed_urls():
+                        for sql, plan in self.query_plans(url).items():
+                            with self.subTest(url=url, sql=sql):
+                                self.assertEqual(
+                                    [step for step in plan
+                                     if FULL_SCAN.match(step)
+                                     or 'TEMP B-TREE' in step], [])
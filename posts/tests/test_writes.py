@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+from unittest import mock
+
+from django.db import IntegrityError, OperationalError
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from posts import writes
+from posts.models import Comment, Follow, Post, User
+
+
+class WriteTests(TransactionTestCase):
+    def setUp(self):
+        writes.reset_metrics()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='запись', author=self.author)
+
+    def test_retries_lock_errors_with_backoff(self):
+        """Запись повторяется при блокировке, ожидание попадает
+        в метрики"""
+
+        calls = []
+
+        def insert():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return Comment.objects.create(text='ок', author=self.reader,
+                                          post=self.post)
+
+        with mock.patch('posts.writes.time.sleep') as sleep:
+            comment = writes.write(insert)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertTrue(Comment.objects.filter(id=comment.id).exists())
+        metrics = writes.metrics()
+        self.assertEqual(metrics['retries'], 2)
+        self.assertEqual(metrics['transactions'], 3)
+        self.assertGreater(metrics['lock_wait_ms'], 0)
+
+    def test_gives_up_after_attempts(self):
+        locked = mock.Mock(side_effect=OperationalError('database is locked'))
+        with mock.patch('posts.writes.time.sleep'), \
+                self.assertRaises(OperationalError):
+            writes.write(locked)
+        self.assertEqual(writes.metrics()['failures'], 1)
+
+    def test_batch_is_one_transaction(self):
+        """Пачка пишется одной транзакцией, ошибка одной записи
+        не откатывает остальные"""
+
+        def comment(num):
+            return lambda: Comment.objects.create(
+                text=f'комментарий {num}', author=self.reader,
+                post=self.post)
+
+        batch = [(comment(num), Future()) for num in range(3)]
+        duplicate = Follow(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        batch.append((lambda: duplicate.save(force_insert=True), Future()))
+        writes.Writer().flush(batch)
+
+        self.assertEqual(writes.metrics()['transactions'], 1)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(Post.objects.get(id=self.post.id).comments_count, 3)
+        self.assertIsInstance(batch[-1][1].exception(), IntegrityError)
+
+    def test_views_write_through_writer_thread(self):
+        client = Client()
+        client.force_login(self.reader)
+        client.post(reverse('add_comment', kwargs={
+            'username': 'author', 'post_id': self.post.id}),
+            {'text': 'через поток'})
+        client.get(reverse('profile_follow', kwargs={'username': 'author'}))
+        self.assertTrue(Comment.objects.filter(text='через поток').exists())
+        self.assertTrue(Follow.objects.filter(user=self.reader).exists())
+        self.assertEqual(writes.metrics()['batched_writes'], 2)
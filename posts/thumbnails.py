@@ -0,0 +1,398 @@
+"""Миниатюры изображений записей, построенные заранее.
+
+Все размеры из POST_THUMBNAILS строятся в пуле процессов сразу после
+того, как запись с новым изображением сохранена. Страницы миниатюры
+не строят: DeferredThumbnailBackend отдаёт готовую миниатюру из KVStore
+sorl, а пока её нет — исходное изображение.
+
+BatchedKVStore держит найденные записи KVStore в LRU процесса, а
+prefetch() подгружает записи о миниатюрах целой страницы одним
+запросом к кэшу и одним к базе.
+
+Для форматов из POST_IMAGE_FORMATS (WebP) строятся варианты каждой
+миниатюры и копия оригинала в каталоге формата; страницы отдают их
+в <source> тега <picture>.
+
+Каждый размер строится ещё и лестницей ширин POST_IMAGE_WIDTHS с теми
+же пропорциями: из готовых ступеней собираются srcset, а sizes задаёт
+шаблон, который знает ширину колонки.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from yatube.cache import LocalLRU
+from yatube.workers import process_pool
+
+from . import conditional, timeline, uploads
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'thumbnails:{}'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не строит миниатюры во время запроса."""
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """Файл миниатюры с тем же именем, что выдал бы sorl."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def ready_thumbnail(self, source, geometry_string, options):
+        """Готовая миниатюра из KVStore или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(source, geometry_string, options))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        return self.ready_thumbnail(source, geometry_string, options) or source
+
+
+class BatchedKVStore(KVStore):
+    """KVStore sorl с LRU в памяти процесса и пакетной подгрузкой.
+
+    В LRU попадают только найденные записи: запись о миниатюре, которой
+    ещё нет, появится, как только её построит пул. Другие процессы
+    узнают о смене изображения не позже THUMBNAIL_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = LocalLRU(settings.THUMBNAIL_LOCAL_MAX_ENTRIES)
+
+    def _remember(self, key, value):
+        self.local.set(key, (value, time.monotonic()
+                             + settings.THUMBNAIL_LOCAL_TIMEOUT))
+
+    def _get_raw(self, key):
+        entry = self.local.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        value = super()._get_raw(key)
+        if value is None:
+            self.local.delete(key)
+        else:
+            self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self.forget(*keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.local.clear()
+
+    def forget(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+
+    def prefetch(self, image_files):
+        """Подгружает записи о файлах: один get_many и один запрос к базе."""
+        now = time.monotonic()
+        keys = set()
+        for image_file in image_files:
+            key = add_prefix(image_file.key)
+            entry = self.local.get(key)
+            if entry is None or now >= entry[1]:
+                keys.add(key)
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        missing = keys - set(found)
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                          .values_list('key', 'value'))
+            self.cache.set_many(
+                {key: stored.get(key, EMPTY_VALUE) for key in missing},
+                sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(stored)
+        for key, value in found.items():
+            if value != EMPTY_VALUE:
+                self._remember(key, value)
+
+
+def ladder(geometry):
+    """Ширины и размеры для srcset: пропорции geometry, ширины из
+    POST_IMAGE_WIDTHS не больше удвоенной ширины geometry."""
+    width, height = map(int, geometry.split('x'))
+    widths = {step for step in settings.POST_IMAGE_WIDTHS
+              if step <= 2 * width}
+    return [(step, f'{step}x{round(step * height / width)}')
+            for step in sorted(widths | {width})]
+
+
+def variants(geometries=None):
+    """Размеры и опции всех миниатюр: лестницы ширин для srcset
+    и варианты в других форматах."""
+    for geometry, options in settings.POST_THUMBNAILS:
+        if geometries is not None and geometry not in geometries:
+            continue
+        for _, step in ladder(geometry):
+            yield step, options
+            for image_format, extra in settings.POST_IMAGE_FORMATS.items():
+                yield step, dict(options, format=image_format, **extra)
+
+
+def derivative_file(name, image_format):
+    """Копия оригинала в другом формате: webp/posts/a.jpg.webp."""
+    return ImageFile(
+        f'{image_format.lower()}/{name}.{EXTENSIONS[image_format]}',
+        default.storage)
+
+
+def thumbnail_files(name, geometries=None):
+    """Файлы миниатюр и производных изображения name."""
+    backend = DeferredThumbnailBackend()
+    source = ImageFile(name, default.storage)
+    files = [backend.thumbnail_file(source, geometry, options)
+             for geometry, options in variants(geometries)]
+    files.extend(derivative_file(name, image_format)
+                 for image_format in settings.POST_IMAGE_FORMATS)
+    return files
+
+
+def prefetch(names, geometries=None):
+    if not hasattr(default.kvstore, 'prefetch'):
+        return
+    default.kvstore.prefetch([
+        thumbnail for name in set(names) if name
+        for thumbnail in thumbnail_files(name, geometries)
+    ])
+
+
+def forget(name):
+    """Убирает из LRU процесса записи об изображении и его миниатюрах."""
+    if not name or not hasattr(default.kvstore, 'forget'):
+        return
+    files = [ImageFile(name, default.storage)] + thumbnail_files(name)
+    default.kvstore.forget(*(
+        add_prefix(image_file.key, identity)
+        for image_file in files for identity in ('image', 'thumbnails')))
+
+
+def defer(func, delay):
+    """Вызывает func в фоновом потоке процесса через delay секунд."""
+    def run():
+        try:
+            func()
+        except Exception:
+            logger.exception('Отложенное задание %r не выполнено', func)
+        finally:
+            connection.close()
+
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def discard(name, grace=None, recheck=None):
+    """Удаляет изображение, его миниатюры и копии в других форматах.
+
+    Файл, изменённый или загруженный повторно меньше grace секунд
+    назад (по умолчанию CONTENT_RELEASE_GRACE), остаётся; recheck, если
+    задан, вызывается, когда grace истечёт. Отложенная проверка живёт
+    в памяти процесса: после перезапуска сирот убирает dedupe_images.
+    """
+    if not _stored(name):
+        return False
+    if grace is None:
+        grace = settings.CONTENT_RELEASE_GRACE
+    modified = default_storage.get_modified_time(name)
+    left = timedelta(seconds=grace) - (timezone.now() - modified)
+    if left > timedelta(0):
+        if recheck is not None:
+            defer(recheck, left.total_seconds())
+        return False
+    forget(name)
+    source = ImageFile(name, default.storage)
+    for image_format in settings.POST_IMAGE_FORMATS:
+        derivative = derivative_file(name, image_format)
+        default.kvstore.delete(derivative, delete_thumbnails=False)
+        derivative.delete()
+    default.kvstore.delete(source)
+    source.delete()
+    return True
+
+
+def picture(image, geometry):
+    """Адреса для <picture>: миниатюра, srcset из готовых ступеней
+    лестницы ширин и такие же srcset в других форматах.
+
+    Пока миниатюры не готовы — оригинал и его готовые производные.
+    """
+    if not image:
+        return {}
+    options = dict(settings.POST_THUMBNAILS)[geometry]
+    backend = DeferredThumbnailBackend()
+    source = ImageFile(image)
+    steps = ladder(geometry)
+
+    def srcset(step_options):
+        ready = ((width, backend.ready_thumbnail(source, step, step_options))
+                 for width, step in steps)
+        return ', '.join(f'{thumbnail.url} {width}w'
+                         for width, thumbnail in ready if thumbnail)
+
+    thumbnail = backend.ready_thumbnail(source, geometry, options)
+    sources = []
+    for image_format, extra in settings.POST_IMAGE_FORMATS.items():
+        if thumbnail:
+            variant = srcset(dict(options, format=image_format, **extra))
+        else:
+            derivative = default.kvstore.get(
+                derivative_file(source.name, image_format))
+            variant = derivative.url if derivative else ''
+        if variant:
+            sources.append({'srcset': variant,
+                            'type': f'image/{image_format.lower()}'})
+    return {'src': (thumbnail or source).url,
+            'srcset': srcset(options) if thumbnail else '',
+            'sources': sources}
+
+
+def build_derivative(name, image_format, options):
+    """Сохраняет копию оригинала в другом формате, если она меньше."""
+    target = derivative_file(name, image_format)
+    if default.kvstore.get(target):
+        return
+    with default.storage.open(name) as file, Image.open(file) as image:
+        if getattr(image, 'is_animated', False):
+            return
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if 'transparency' in image.info else 'RGB')
+        content = BytesIO()
+        image.save(content, image_format, **options)
+        size = image.size
+    if content.tell() >= default.storage.size(name):
+        return
+    if not default.storage.exists(target.name):
+        default.storage.save(target.name, ContentFile(content.getvalue()))
+    target.set_size(size)
+    default.kvstore.set(target)
+
+
+def touch_pages(name):
+    """Меняет версии страниц с изображением name: кэш фрагментов и
+    ETag перестают отдавать оригинал вместо готовых миниатюр."""
+    posts = Post.objects.filter(image=name).select_related('author')
+    for post in posts:
+        conditional.touch_post(post, post.group_id)
+    for author_id in {post.author_id for post in posts}:
+        timeline.touch_followers(author_id)
+
+
+def build(name):
+    """Нормализует оригинал, строит миниатюры и производные;
+    выполняется в пуле."""
+    backend = ThumbnailBackend()
+    try:
+        uploads.normalize(name)
+        for geometry, options in variants():
+            backend.get_thumbnail(name, geometry, **options)
+        for image_format, options in settings.POST_IMAGE_FORMATS.items():
+            build_derivative(name, image_format, options)
+        touch_pages(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', name)
+        cache.delete(JOB_KEY.format(name))
+        return False
+    return True
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = process_pool(settings.THUMBNAIL_WORKERS)
+        return _pool
+
+
+def _submit(name):
+    global _pool
+    pool = _get_pool()
+    try:
+        pool.submit(build, name)
+    except RuntimeError:
+        # Пул сломан или остановлен: следующее задание создаст новый.
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def _stored(name):
+    try:
+        return bool(name) and default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def schedule(name):
+    """Ставит построение миниатюр в очередь пула.
+
+    Задание на изображение ставится один раз на THUMBNAIL_JOB_TIMEOUT
+    для всех процессов сервера: метка лежит в общем кэше. При
+    THUMBNAIL_WORKERS = 0 миниатюры строятся сразу.
+    """
+    if not _stored(name):
+        return False
+    if not cache.add(JOB_KEY.format(name), True,
+                     settings.THUMBNAIL_JOB_TIMEOUT):
+        return False
+    if not settings.THUMBNAIL_WORKERS:
+        return build(name)
+    try:
+        _submit(name)
+    except RuntimeError:
+        logger.exception('Пул миниатюр недоступен, задание %s пропущено',
+                         name)
+        cache.delete(JOB_KEY.format(name))
+        return False
+    return True
+
+
+def schedule_on_commit(name):
+    transaction.on_commit(lambda: schedule(name))
@@ -0,0 +1,260 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации поста запись о нём раскладывается в ленты подписчиков
+автора, поэтому страница /follow/ читается одним диапазоном по индексу
+(user, -pub_date, -post). Авторы, у которых подписчиков больше
+TIMELINE_FANOUT_LIMIT, в ленты не раскладываются: их посты подмешиваются
+при чтении слиянием упорядоченных выборок (MergedFeed).
+
+При подписке и при падении ниже TIMELINE_FANOUT_LIMIT в ленту
+раскладываются только последние TIMELINE_BACKFILL_LIMIT постов автора.
+Более старые посты подмешиваются при чтении тем же слиянием: источник
+— посты автора старше его самой старой строки в ленте
+(truncated_authors()).
+
+Когда автор пересекает TIMELINE_FANOUT_LIMIT, followers_changed()
+перестраивает его строки в лентах: при росте они удаляются, при
+падении последние посты раскладываются по всем подписчикам, в том
+числе подписавшимся, пока автор не раскладывался.
+"""
+import heapq
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from . import versions
+from .models import Follow, Post, PostQuerySet, TimelineEntry, UserStats
+from .paginator import CURSOR_ORDERING, get_page
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def _bulk_add(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def is_celebrity(author):
+    return UserStats.objects.filter(
+        user=author,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+FollowedAuthors = namedtuple('FollowedAuthors', 'celebrities truncated')
+
+
+def followed_authors(user):
+    """Авторы из подписок, чьи посты подмешиваются при чтении, одним
+    запросом: знаменитости, чьи посты не раскладываются, и авторы, чьи
+    старые посты не попали в ленту, с датой и id самого старого поста
+    в ленте."""
+    oldest = (TimelineEntry.objects
+              .filter(user=OuterRef('user'), author=OuterRef('author'))
+              .order_by('pub_date', 'post_id'))
+    older = Post.objects.filter(
+        Q(pub_date__lt=OuterRef('oldest_date'))
+        | Q(pub_date=OuterRef('oldest_date'), id__lt=OuterRef('oldest_id')),
+        author=OuterRef('author'))
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    rows = (
+        Follow.objects.filter(user=user)
+        .annotate(oldest_date=Subquery(oldest.values('pub_date')[:1]),
+                  oldest_id=Subquery(oldest.values('post_id')[:1]))
+        .annotate(truncated=Exists(older))
+        .filter(Q(author__stats__followers_count__gt=limit)
+                | Q(author__stats__posts_count__gt=(
+                    settings.TIMELINE_BACKFILL_LIMIT), truncated=True))
+        .values_list('author', 'author__stats__followers_count',
+                     'oldest_date', 'oldest_id'))
+    authors = FollowedAuthors([], [])
+    for author_id, followers_count, oldest_date, oldest_id in rows:
+        if followers_count > limit:
+            authors.celebrities.append(author_id)
+        else:
+            authors.truncated.append((author_id, oldest_date, oldest_id))
+    return authors
+
+
+def fan_out(post):
+    if is_celebrity(post.author_id):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True))
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post.id,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def touch_followers(author_id):
+    """Сбрасывает кэш лент подписчиков после изменения постов автора."""
+    if is_celebrity(author_id):
+        versions.bump(f'author:{author_id}')
+        return
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .values_list('user_id', flat=True))
+    versions.bump(f'author:{author_id}',
+                  *(f'feed:{user_id}' for user_id in followers))
+
+
+def feed_version(user, celebrities):
+    """Версия ленты подписок для ключа кэша фрагмента follow.html;
+    celebrities — followed_authors(user).celebrities."""
+    found = versions.get_versions(
+        f'feed:{user.pk}',
+        *(f'author:{author_id}' for author_id in celebrities)
+    )
+    return max(found.values())
+
+
+def backfill(user, author):
+    if is_celebrity(author):
+        return
+    posts = (Post.objects.filter(author=author)
+             .order_by('-pub_date', '-id')
+             .values_list('id', 'pub_date')
+             [:settings.TIMELINE_BACKFILL_LIMIT])
+    _bulk_add(
+        TimelineEntry(user=user, post_id=post_id,
+                      author=author, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def refill(author_id):
+    """Раскладывает последние посты автора в ленты всех подписчиков."""
+    posts = list(Post.objects.filter(author_id=author_id)
+                 .order_by('-pub_date', '-id')
+                 .values_list('id', 'pub_date')
+                 [:settings.TIMELINE_BACKFILL_LIMIT])
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .values_list('user_id', flat=True))
+    entries = (TimelineEntry(user_id=user_id, post_id=post_id,
+                             author_id=author_id, pub_date=pub_date)
+               for user_id in followers.iterator()
+               for post_id, pub_date in posts)
+    while True:
+        chunk = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not chunk:
+            return
+        _bulk_add(chunk)
+
+
+def followers_changed(author_id, delta):
+    """Перестраивает ленты, если число подписчиков автора пересекло
+    TIMELINE_FANOUT_LIMIT; вызывается после изменения счётчика."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    count = (UserStats.objects.filter(user_id=author_id)
+             .values_list('followers_count', flat=True).first())
+    if delta > 0 and count == limit + 1:
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+    elif delta < 0 and count == limit:
+        refill(author_id)
+    else:
+        return
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .values_list('user_id', flat=True))
+    versions.bump(f'author:{author_id}',
+                  *(f'feed:{user_id}' for user_id in followers))
+
+
+def prune(user, author):
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def rebuild(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    for follow in Follow.objects.filter(user=user).select_related('author'):
+        backfill(user, follow.author)
+
+
+class MergedFeed:
+    """Посты нескольких непересекающихся источников по убыванию
+    (дата, id).
+
+    Каждый источник — QuerySet со своей парой полей (дата, id поста),
+    который читается по своему индексу уже упорядоченным; страница
+    собирается слиянием в Python, без общей сортировки во временном
+    B-дереве. Поддерживает count() и срезы для Paginator, order_by()
+    и seek() для CursorPaginator.
+    """
+    ordered = True
+
+    def __init__(self, sources, descending=True, seek_key=None):
+        self.sources = sources
+        self.descending = descending
+        self.seek_key = seek_key
+
+    def order_by(self, *ordering):
+        return MergedFeed(self.sources, ordering[0].startswith('-'),
+                          self.seek_key)
+
+    def seek(self, lookup, key):
+        return MergedFeed(self.sources, self.descending, (lookup, key))
+
+    def _rows(self, queryset, ordering, limit):
+        date_field, id_field = (name.lstrip('-') for name in ordering)
+        if self.seek_key is not None:
+            lookup, (pub_date, post_id) = self.seek_key
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__{lookup}': pub_date})
+                | Q(**{date_field: pub_date,
+                       f'{id_field}__{lookup}': post_id}))
+        if not self.descending:
+            ordering = (date_field, id_field)
+        return queryset.order_by(*ordering).values_list(
+            date_field, id_field)[:limit]
+
+    def count(self):
+        return sum(queryset.count() for queryset, _ in self.sources)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if index.stop is None:
+            raise ValueError('MergedFeed нужен срез с концом.')
+        merged = heapq.merge(
+            *(self._rows(queryset, ordering, index.stop)
+              for queryset, ordering in self.sources),
+            reverse=self.descending)
+        ids = [post_id for _, post_id in merged][start:index.stop]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def follow_page(request, user, authors, cursor=False):
+    """Страница ленты подписок пользователя; authors —
+    followed_authors(user)."""
+    celebrities = authors.celebrities
+    older = [
+        (Post.objects.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=post_id),
+            author_id=author_id), CURSOR_ORDERING)
+        for author_id, pub_date, post_id in authors.truncated]
+    if celebrities or older:
+        entries = (TimelineEntry.objects.filter(user=user)
+                   .exclude(author__in=celebrities))
+        return get_page(request, MergedFeed(
+            [(entries, TIMELINE_ORDERING)]
+            + [(Post.objects.filter(author_id=author_id), CURSOR_ORDERING)
+               for author_id in celebrities] + older), cursor=cursor)
+
+    entries = (TimelineEntry.objects.filter(user=user)
+               .order_by(*TIMELINE_ORDERING)
+               .select_related(*(f'post__{name}'
+                                 for name in PostQuerySet.FEED_RELATED)))
+    page = get_page(request, entries, ordering=TIMELINE_ORDERING,
+                    cursor=cursor)
+    page.object_list = [entry.post for entry in page.object_list]
+    return page
@@ -0,0 +1,217 @@
+"""Перенос групп, записей, комментариев и подписок в формате NDJSON.
+
+Строка файла — JSON-объект с ключом model и полями одной строки
+таблицы. Пользователи указываются по username, группы по slug, поэтому
+файл подходит для базы с другими id пользователей и групп. Записи
+получают в базе новые id: комментарии файла ссылаются на id записей
+источника и переводятся через словарь «старый id — новый», поэтому
+комментарии загружаются только вместе со своими записями. Модели
+выгружаются в порядке зависимостей, файлы изображений не переносятся.
+
+Строки, которые в базе уже есть, пропускаются: группы по slug, записи
+по автору, pub_date и тексту, комментарии по записи, created, автору и
+тексту, подписки по паре пользователей. Записи с тем же автором и
+pub_date, но другим текстом загружаются как новые. Повторная загрузка
+того же файла ничего не дублирует.
+
+Загрузка идёт bulk_create пачками, каждая в своей транзакции, без
+сигналов моделей; счётчики и ленты подписок после неё пересобирает
+bulk.rebuild_derived().
+"""
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+
+from django.contrib.auth.hashers import make_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import stats
+from .bulk import bulk_insert, chunked, in_batch_size
+from .models import Comment, Follow, Group, Post, User
+
+# Поле записи файла -> поле values_list() при выгрузке.
+EXPORT_FIELDS = {
+    'group': (Group, {'id': 'id', 'title': 'title', 'slug': 'slug',
+                      'description': 'description'}),
+    'post': (Post, {'id': 'id', 'text': 'text', 'pub_date': 'pub_date',
+                    'author': 'author__username', 'group': 'group__slug',
+                    'image': 'image'}),
+    'comment': (Comment, {'id': 'id', 'text': 'text', 'created': 'created',
+                          'author': 'author__username', 'post': 'post_id'}),
+    'follow': (Follow, {'user': 'user__username',
+                        'author': 'author__username'}),
+}
+MODELS = tuple(EXPORT_FIELDS)
+
+
+class TransferError(Exception):
+    pass
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder отбрасывает микросекунды, а курсоры лент
+        # сравнивают даты точно.
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_lines(models=MODELS, chunk_size=2000):
+    """Строки NDJSON; курсор читает таблицы пачками по chunk_size."""
+    for name in models:
+        model, fields = EXPORT_FIELDS[name]
+        rows = (model.objects.order_by('pk')
+                .values_list(*fields.values())
+                .iterator(chunk_size=chunk_size))
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row), model=name),
+                             cls=Encoder, ensure_ascii=False)
+
+
+def read_records(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise TransferError(f'Строка {number}: {error}')
+        if record.get('model') not in EXPORT_FIELDS:
+            raise TransferError(f'Строка {number}: неизвестная модель '
+                                f'{record.get("model")!r}')
+        yield record
+
+
+def find_ids(model, keys, fields, matched=()):
+    """id строк model по ключам — кортежам значений fields и matched.
+
+    IN-списки строятся по fields и режутся на пачки под предел
+    параметров запроса, поля matched сверяются уже в Python.
+    """
+    found = {}
+    for batch in chunked(keys, in_batch_size(len(keys), len(fields))):
+        filters = {f'{field}__in': {key[num] for key in batch}
+                   for num, field in enumerate(fields)}
+        rows = (model.objects.order_by().filter(**filters)
+                .values_list(*fields, *matched, 'id'))
+        found.update((row[:-1], row[-1]) for row in rows
+                     if row[:-1] in keys)
+    return found
+
+
+def user_ids(usernames):
+    """id пользователей по username; недостающие создаются без пароля."""
+    keys = {(username,) for username in usernames}
+    found = find_ids(User, keys, ('username',))
+    missing = keys - set(found)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password=make_password(None))
+             for username, in missing],
+            ignore_conflicts=True)
+        created = find_ids(User, missing, ('username',))
+        stats.create_user_stats(created.values())
+        found.update(created)
+    return {username: user_id for (username,), user_id in found.items()}
+
+
+def group_ids(slugs):
+    found = find_ids(Group, {(slug,) for slug in slugs}, ('slug',))
+    return {slug: group_id for (slug,), group_id in found.items()}
+
+
+def import_groups(records, post_ids):
+    records = {record['slug']: record for record in records}
+    existing = group_ids(records)
+    groups = [Group(title=record['title'], slug=slug,
+                    description=record['description'])
+              for slug, record in records.items() if slug not in existing]
+    return bulk_insert(Group, groups, len(records))
+
+
+def find_posts(keys):
+    """id записей базы по ключам (author_id, pub_date, text)."""
+    return find_ids(Post, keys, ('author_id', 'pub_date'), ('text',))
+
+
+def import_posts(records, post_ids):
+    authors = user_ids(record['author'] for record in records)
+    groups = group_ids(record['group'] for record in records
+                       if record['group'])
+    # Записи одного автора с одним pub_date различаются текстом.
+    keys = {record['id']: (authors[record['author']],
+                           parse_datetime(record['pub_date']),
+                           record['text'])
+            for record in records}
+    found = find_posts(set(keys.values()))
+    new = {}
+    for record in records:
+        key = keys[record['id']]
+        if key not in found and key not in new:
+            author_id, pub_date, text = key
+            new[key] = Post(text=text, pub_date=pub_date,
+                            author_id=author_id,
+                            group_id=groups.get(record['group']),
+                            image=record['image'] or None)
+    created = bulk_insert(Post, new.values(), len(records))
+    # SQLite не возвращает id из bulk_create: новые id читаются по ключам.
+    found.update(find_posts(set(new)))
+    for old_id, key in keys.items():
+        post_ids[old_id] = found[key]
+    return created
+
+
+def import_comments(records, post_ids):
+    authors = user_ids(record['author'] for record in records)
+    # Комментарии к записям, которых не было в файле, пропускаются.
+    records = {(post_ids[record['post']], parse_datetime(record['created']),
+                authors[record['author']], record['text']): record
+               for record in records if record['post'] in post_ids}
+    existing = find_ids(Comment, set(records), ('post_id', 'created'),
+                        ('author_id', 'text'))
+    comments = [Comment(text=text, created=created,
+                        author_id=author_id, post_id=post_id)
+                for post_id, created, author_id, text in records
+                if (post_id, created, author_id, text) not in existing]
+    return bulk_insert(Comment, comments, len(records))
+
+
+def import_follows(records, post_ids):
+    users = user_ids(name for record in records
+                     for name in (record['user'], record['author']))
+    pairs = {(users[record['user']], users[record['author']])
+             for record in records if record['user'] != record['author']}
+    existing = find_ids(Follow, pairs, ('user_id', 'author_id'))
+    follows = [Follow(user_id=user_id, author_id=author_id)
+               for user_id, author_id in pairs
+               if (user_id, author_id) not in existing]
+    return bulk_insert(Follow, follows, len(records))
+
+
+IMPORTERS = {
+    'group': import_groups,
+    'post': import_posts,
+    'comment': import_comments,
+    'follow': import_follows,
+}
+
+
+def import_records(records, chunk_size=2000):
+    """Загружает записи файла; возвращает (прочитано, пропущено)
+    по моделям."""
+    read, skipped = Counter(), Counter()
+    # id записей источника -> id в базе, для комментариев.
+    post_ids = {}
+    for name, group in groupby(records, key=lambda record: record['model']):
+        for chunk in chunked(group, chunk_size):
+            # Созданные для пачки пользователи и её строки — одна
+            # транзакция.
+            with transaction.atomic():
+                created = IMPORTERS[name](chunk, post_ids)
+            read[name] += len(chunk)
+            skipped[name] += len(chunk) - created
+    return read, skipped
@@ -0,0 +1,81 @@
+"""Проверка и нормализация загружаемых изображений.
+
+Загрузки пишутся во временный файл (FILE_UPLOAD_HANDLERS), а форма
+читает только заголовок изображения: формат и размеры. Лимиты байтов
+и пикселей проверяются до любого полного декодирования. Поворот по
+EXIF и уменьшение больших оригиналов выполняются в пуле миниатюр,
+вне обработки запроса.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+# Снимки с телефонов Pillow опознаёт как MPO: это JPEG с дополнительными
+# кадрами, и обрабатывать его нужно как JPEG.
+FORMAT_ALIASES = {'MPO': 'JPEG'}
+
+
+def probe(file):
+    """Формат и размеры изображения по заголовку, без декодирования."""
+    position = file.tell()
+    try:
+        with Image.open(file) as image:
+            return (FORMAT_ALIASES.get(image.format, image.format),
+                    image.size)
+    finally:
+        file.seek(position)
+
+
+def validate_upload(file):
+    if file.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='file_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)})
+    try:
+        image_format, (width, height) = probe(file)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Загрузите правильное изображение.',
+                              code='invalid_image')
+    if image_format not in settings.POST_IMAGE_ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.', code='invalid_format',
+            params={'format': image_format})
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение %(width)s×%(height)s слишком большое.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height})
+
+
+def normalize(name):
+    """Поворачивает оригинал по EXIF и уменьшает его до
+    POST_IMAGE_MAX_SIDE; возвращает True, если файл изменён."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    with default_storage.open(name) as file, Image.open(file) as image:
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        image_format = FORMAT_ALIASES.get(image.format, image.format)
+        # Дополнительные кадры MPO не анимация: сохраняется первый.
+        animated = (getattr(image, 'is_animated', False)
+                    and image_format != 'JPEG')
+        if animated or (orientation == 1 and max(image.size) <= max_side):
+            return False
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (max_side, max_side))
+        normalized = ImageOps.exif_transpose(image)
+        normalized.thumbnail((max_side, max_side), Image.LANCZOS)
+        content = BytesIO()
+        options = ({'quality': settings.POST_IMAGE_QUALITY}
+                   if image_format == 'JPEG' else {})
+        normalized.save(content, image_format, **options)
+    path = default_storage.path(name)
+    temporary = f'{path}.normalize'
+    with open(temporary, 'wb') as file:
+        file.write(content.getvalue())
+    os.replace(temporary, path)
+    return True
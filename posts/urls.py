@@ -1,13 +1,20 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("rss/", feeds.index_rss, name="index_rss"),
+    path("atom/", feeds.index_atom, name="index_atom"),
     path("follow/", views.follow_index, name="follow_index"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
+    path("group/<slug:slug>/rss/", feeds.group_rss, name="group_rss"),
+    path("group/<slug:slug>/atom/", feeds.group_atom, name="group_atom"),
     path("new/", views.new_post, name="new_post"),
+    path("search/", views.post_search, name="search"),
     path("<str:username>/", views.profile, name="profile"),
+    path("<str:username>/rss/", feeds.profile_rss, name="profile_rss"),
+    path("<str:username>/atom/", feeds.profile_atom, name="profile_atom"),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
     path(
         "<str:username>/<int:post_id>/edit/",
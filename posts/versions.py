@@ -0,0 +1,27 @@
+"""Версии данных в кэше для инвалидации кэшированных фрагментов.
+
+Версия хранится как время последнего изменения. Если ключа нет
+в кэше (истёк или вытеснен), версия считается новой, и зависящие от
+неё фрагменты просто пересобираются.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+
+
+def get_versions(*names):
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump(*names):
+    now = time.time()
+    cache.set_many({VERSION_KEY.format(name): now for name in names},
+                   timeout=None)
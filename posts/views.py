@@ -1,31 +1,42 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from yatube.settings import POSTS_ON_PAGE
 
+from . import search, timeline, versions, writes
+from .conditional import conditional_page, follow_feed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginator import get_page
 
 
+@conditional_page(lambda: ['posts'])
 def index(request):
-    post_page = Post.objects.all()
-    paginator = Paginator(post_page, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'index.html', {'page': page})
+    post_page = Post.objects.for_feed()
+    page = get_page(request, post_page)
+    # Версия в ключе фрагмента: ETag и HTML меняются вместе.
+    return render(request, 'index.html', {
+        'page': page,
+        'posts_version': versions.get_versions('posts')['posts']})
 
 
+@conditional_page(lambda slug: [f'group:{slug}'])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_posts = group.posts.all()
-    paginator = Paginator(group_posts, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group_posts = group.posts.for_feed()
+    page = get_page(request, group_posts)
     return render(request, 'group.html', {'group': group, 'page': page})
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search.SearchResults(query), settings.POSTS_ON_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'search.html', {'page': page, 'query': query})
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None,
@@ -33,17 +44,17 @@ def new_post(request):
     if form.is_valid():
         new = form.save(commit=False)
         new.author = request.user
-        new.save()
+        writes.create(new)
         return redirect('index')
     return render(request, 'new_post.html', {'form': form, 'is_edit': False})
 
 
+@conditional_page(lambda username: [f'profile:{username}'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    all_posts = author.posts.all()
-    paginator = Paginator(all_posts, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    all_posts = author.posts.for_feed()
+    page = get_page(request, all_posts)
     is_following = False
     if request.user.is_authenticated:
         is_following = author.following.filter(user=request.user).exists()
@@ -55,8 +66,16 @@ def profile(request, username):
     )
 
 
+@conditional_page(
+    lambda username, post_id: [f'post:{post_id}', f'profile:{username}'],
+    csrf=True)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        Post.objects.for_feed().with_comments()
+        .select_related('author__stats'),
+        author__username=username,
+        id=post_id,
+    )
     author = post.author
     comments = post.comments.all()
     form = CommentForm()
@@ -74,14 +93,15 @@ def post_view(request, username, post_id):
 
 @login_required
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(Post.objects.for_feed(),
+                             author__username=username, id=post_id)
     if post.author != request.user:
         return redirect('post', username=username, post_id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        post.save()
+        post.save(update_fields=PostForm.Meta.fields)
         return redirect('post', username=username, post_id=post_id)
 
     return render(request, 'new_post.html',
@@ -113,18 +133,22 @@ def add_comment(request, username, post_id):
         new = form.save(commit=False)
         new.author = request.user
         new.post = post
-        new.save()
+        writes.create(new, coalesce=True)
     return redirect("post", username=username, post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     user = request.user
-    post_page = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(post_page, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'follow.html', {'page': page, })
+    authors, version = follow_feed(user)
+    page = timeline.follow_page(request, user, authors)
+    return render(
+        request,
+        'follow.html',
+        {'page': page,
+         'feed_version': version,
+         'cache_timeout': settings.FOLLOW_PAGE_CACHE_TIMEOUT}
+    )
 
 
 @login_required
@@ -133,7 +157,7 @@ def profile_follow(request, username):
     user = request.user
     is_follower = author.following.filter(user=request.user).exists()
     if user != author and not is_follower:
-        Follow.objects.create(author=author, user=user)
+        writes.create(Follow(author=author, user=user), coalesce=True)
 
     return redirect("profile", username=username)
 
@@ -144,6 +168,6 @@ def profile_unfollow(request, username):
     user = request.user
     follower = Follow.objects.filter(author=author, user=user)
     if follower.exists():
-        follower.delete()
+        writes.write(follower.delete, coalesce=True)
 
     return redirect("profile", username=username)
@@ -0,0 +1,182 @@
+"""Запись в SQLite при конкуренции писателей.
+
+SQLite пропускает одного писателя за раз. write() выполняет запись
+в собственной транзакции и при ошибке блокировки повторяет её с
+экспоненциальной задержкой со случайным разбросом. С coalesce=True
+мелкие записи (комментарии, подписки) передаются потоку-писателю
+процесса: записи, накопившиеся за WRITE_BATCH_DELAY, выполняются одной
+транзакцией — одна блокировка и один коммит вместо нескольких. Каждая
+запись пачки идёт в своей точке сохранения, и ошибка одной не
+откатывает остальные.
+
+Если вызывающий уже внутри atomic(), запись выполняется сразу в его
+транзакции: повторить чужую транзакцию нельзя, а поток-писатель со
+своим соединением ждал бы её блокировку.
+
+metrics() возвращает счётчики процесса: транзакции, повторы, отказы,
+записи из пачек и суммарное ожидание блокировки.
+"""
+import contextvars
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from functools import partial
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(**values):
+    with _metrics_lock:
+        _metrics.update(values)
+
+
+def metrics():
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    snapshot['lock_wait_ms'] = round(snapshot.get('lock_wait_ms', 0), 3)
+    return snapshot
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def is_lock_error(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def _with_retries(body):
+    """Выполняет body() в транзакции, повторяя её при блокировке."""
+    attempts = settings.WRITE_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                # BEGIN IMMEDIATE ждёт блокировку записи до busy_timeout.
+                _count(transactions=1, lock_wait_ms=(
+                    time.perf_counter() - started) * 1000)
+                return body()
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            if attempt == attempts - 1:
+                _count(failures=1)
+                logger.warning('Запись не дождалась блокировки '
+                               'за %s попыток', attempts)
+                raise
+            delay = random.uniform(
+                0, settings.WRITE_RETRY_BASE_DELAY * 2 ** attempt)
+            _count(retries=1, lock_wait_ms=(
+                time.perf_counter() - started + delay) * 1000)
+            time.sleep(delay)
+
+
+class Writer:
+    """Поток-писатель процесса: выполняет записи пачками."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, func):
+        future = Future()
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='posts-writer', daemon=True)
+                self.thread.start()
+        # Запись выполняется в контексте вызывающего: роутер баз
+        # отмечает в нём, что запрос писал.
+        context = contextvars.copy_context()
+        self.queue.put((partial(context.run, func), future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + settings.WRITE_BATCH_DELAY
+            while len(batch) < settings.WRITE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    @staticmethod
+    def apply(pending, outcomes):
+        """Выполняет записи пачки, каждую в своей точке сохранения."""
+        outcomes.clear()
+        for func, future in pending:
+            try:
+                with transaction.atomic():
+                    outcomes[future] = (func(), None)
+            except OperationalError as error:
+                # Блокировка откатывает и повторяет всю пачку.
+                if is_lock_error(error):
+                    raise
+                outcomes[future] = (None, error)
+            except Exception as error:
+                outcomes[future] = (None, error)
+
+    def flush(self, batch):
+        pending = [(func, future) for func, future in batch
+                   if future.set_running_or_notify_cancel()]
+        outcomes = {}
+        try:
+            _with_retries(lambda: self.apply(pending, outcomes))
+        except Exception as error:
+            for _, future in pending:
+                future.set_exception(error)
+            return
+        finally:
+            connection.close_if_unusable_or_obsolete()
+        _count(batched_writes=len(pending))
+        for future, (result, error) in outcomes.items():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+writer = Writer()
+
+
+def write(func, coalesce=False):
+    """Выполняет запись func() и возвращает её результат.
+
+    func может быть вызвана повторно, если транзакция откатилась
+    из-за блокировки.
+    """
+    if connection.in_atomic_block:
+        return func()
+    if coalesce and settings.WRITE_COALESCE:
+        return writer.submit(func).result(settings.WRITE_QUEUE_TIMEOUT)
+    return _with_retries(func)
+
+
+def create(instance, coalesce=False):
+    """Вставляет новый объект модели через write()."""
+    def insert():
+        # После отката повторная вставка начинается с чистого объекта.
+        instance.pk = None
+        instance._state.adding = True
+        instance.save(force_insert=True)
+        return instance
+
+    return write(insert, coalesce)
@@ -1,6 +1,9 @@
 import tempfile
+from io import BytesIO
 
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 from mixer.backend.django import mixer as _mixer
 from posts.models import Post, Group
 
@@ -41,3 +44,44 @@ def few_posts_with_group(mixer, user, group):
 def another_few_posts_with_group_with_follower(mixer, user, another_user, group):
     mixer.blend('posts.Follow', user=user, author=another_user)
     mixer.cycle(20).blend(Post, author=another_user, group=group)
+
+
+def jpeg_file(num):
+    buffer = BytesIO()
+    Image.new('RGB', (64 + num, 48), 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(f'feed_{num}.jpg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@pytest.fixture
+def large_feed(mixer, user, another_user, group):
+    """Return a post of `user` in a feed of many posts, comments and follows.
+
+    `user` follows every other author, so all feeds are full. Every
+    fourth post has an image, so pages also load thumbnail records.
+    """
+    from django.contrib.auth.models import User
+    authors = [another_user] + mixer.cycle(4).blend(User)
+    for author in authors:
+        mixer.blend('posts.Follow', user=user, author=author)
+    posts = mixer.cycle(60).blend(
+        Post,
+        author=(authors[num % len(authors)] for num in range(60)),
+        group=group,
+        image=None,
+    )
+    own_posts = mixer.cycle(15).blend(Post, author=user, group=group, image=None)
+    commented = own_posts[-1]
+    for num, image_post in enumerate(posts[::4] + own_posts[::-4]):
+        image_post.image.save(f'feed_{num}.jpg', jpeg_file(num))
+    mixer.cycle(40).blend(
+        'posts.Comment',
+        post=(posts[num % len(posts)] for num in range(40)),
+        author=(authors[num % len(authors)] for num in range(40)),
+    )
+    mixer.cycle(25).blend(
+        'posts.Comment',
+        post=commented,
+        author=(authors[num % len(authors)] for num in range(25)),
+    )
+    return commented
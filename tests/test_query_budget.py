@@ -0,0 +1,73 @@
+import re
+from collections import Counter
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+
+pytestmark = [pytest.mark.django_db]
+
+# Имя маршрута: (максимум SQL-запросов, максимум суммарного времени SQL в мс)
+# Страницы с картинками читают записи о миниатюрах одним запросом к
+# thumbnail_kvstore.
+QUERY_BUDGETS = {
+    'index': (5, 150),
+    'group': (5, 150),
+    'profile': (7, 150),
+    'post': (5, 150),
+    'follow_index': (6, 150),
+    'post_edit': (4, 150),
+    'new_post': (3, 150),
+    'signup': (2, 150),
+}
+
+
+def route_kwargs(name, post):
+    return {
+        'group': {'slug': post.group.slug},
+        'profile': {'username': post.author.username},
+        'post': {'username': post.author.username, 'post_id': post.id},
+        'post_edit': {'username': post.author.username, 'post_id': post.id},
+    }.get(name, {})
+
+
+def normalize(sql):
+    return re.sub(r"\b\d+\b|'[^']*'", '?', sql)
+
+
+def describe(queries):
+    """Запросы, сгруппированные по форме; повторы (N+1) помечены."""
+    shapes = Counter(normalize(query['sql']) for query in queries)
+    return '\n'.join(
+        f"{'+' if times > 1 else ' '} {times}x {shape}"
+        for shape, times in shapes.most_common()
+    )
+
+
+class TestQueryBudget:
+
+    @pytest.mark.parametrize('name', QUERY_BUDGETS)
+    def test_route_query_budget(self, name, user_client, large_feed):
+        max_queries, max_sql_ms = QUERY_BUDGETS[name]
+        url = reverse(name, kwargs=route_kwargs(name, large_feed))
+        cache.clear()
+        # Холодный процесс: записи о миниатюрах читаются из базы.
+        default.kvstore.local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = user_client.get(url)
+        assert response.status_code == 200, (
+            f'Страница `{url}` вернула код {response.status_code}'
+        )
+
+        sql_ms = sum(float(query['time']) for query in queries) * 1000
+        assert len(queries) <= max_queries, (
+            f'Страница `{url}` выполнила {len(queries)} SQL-запросов '
+            f'при бюджете {max_queries}:\n{describe(queries)}'
+        )
+        assert sql_ms <= max_sql_ms, (
+            f'SQL страницы `{url}` занял {sql_ms:.1f} мс '
+            f'при бюджете {max_sql_ms} мс:\n{describe(queries)}'
+        )
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import resolve
 
 from .models import Contact
 
@@ -12,6 +13,14 @@ class CreationForm(UserCreationForm):
         model = User
         fields = ("first_name", "last_name", "username", "email")
 
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        # Профиль живёт по адресу /<username>/: имя вроде rss или search
+        # открыло бы вместо профиля другую страницу сайта.
+        if resolve(f"/{username}/").url_name != "profile":
+            raise forms.ValidationError("Это имя занято адресом сайта")
+        return username
+
 
 class ContactForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,317 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим файлом SQLite.
+
+Все процессы-обработчики работают с одним файлом LOCATION, поэтому
+фрагмент шаблона собирается один раз на сервер, а не в каждом процессе.
+Локальный LRU снимает повторные чтения одного ключа, но верит своей
+копии не дольше LOCAL_TIMEOUT секунд.
+
+Защита от «лавины» при истечении ключа:
+
+* вероятностный пересчёт заранее (XFetch): чем ближе срок и чем дольше
+  значение считалось в прошлый раз, тем вероятнее get() вернёт промах
+  до истечения;
+* single-flight: промах получает только процесс, взявший блокировку
+  ключа, остальные до STALE_TIMEOUT секунд после истечения получают
+  устаревшую копию.
+
+Промах, выданный get(), снимается следующим set() этого ключа.
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAX_PENDING_MISSES = 10000
+MAX_QUERY_KEYS = 500
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'expires REAL, delta REAL NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS cache_entries_expires '
+    'ON cache_entries (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_locks ('
+    'key TEXT PRIMARY KEY, expires REAL NOT NULL)',
+)
+
+
+class LocalLRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.stale_timeout = options.get('STALE_TIMEOUT', 300)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self.beta = options.get('BETA', 1.0)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self.cull_probability = options.get('CULL_PROBABILITY', 0.01)
+        self.local = LocalLRU(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._misses = {}
+        self._misses_lock = threading.Lock()
+        self._thread = threading.local()
+
+    @property
+    def db(self):
+        conn = getattr(self._thread, 'conn', None)
+        if conn is None or self._thread.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._thread.conn = conn
+            self._thread.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _read(self, key, now):
+        entry = self.local.get(key)
+        if entry is not None and now < entry[3] and (
+                entry[1] is None or now < entry[1]):
+            return entry
+        row = self.db.execute(
+            'SELECT value, expires, delta FROM cache_entries WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            self.local.delete(key)
+            return None
+        value, expires, delta = row
+        if expires is not None and now >= expires + self.stale_timeout:
+            self.local.delete(key)
+            return None
+        entry = (pickle.loads(value), expires, delta,
+                 now + self.local_timeout)
+        self.local.set(key, entry)
+        return entry
+
+    def _acquire(self, key, now):
+        cursor = self.db.execute(
+            'INSERT INTO cache_locks (key, expires) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET expires = excluded.expires '
+            'WHERE cache_locks.expires <= ?',
+            (key, now + self.lock_timeout, now))
+        return cursor.rowcount == 1
+
+    def _miss(self, key, now, default):
+        with self._misses_lock:
+            if len(self._misses) > MAX_PENDING_MISSES:
+                self._misses.clear()
+            self._misses[key] = now
+        return default
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        entry = self._read(key, now)
+        if entry is None:
+            self._acquire(key, now)
+            return self._miss(key, now, default)
+        value, expires, delta, _ = entry
+        if expires is None:
+            return value
+        early = delta * self.beta * -math.log(1.0 - random.random())
+        if now < expires - early:
+            return value
+        if self._acquire(key, now):
+            return self._miss(key, now, default)
+        if now < expires + self.stale_timeout:
+            return value
+        return default
+
+    def get_many(self, keys, version=None):
+        """Одним запросом к файлу; без пересчёта заранее и блокировок."""
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found = {}
+        remote = []
+        for key, original in keys.items():
+            entry = self.local.get(key)
+            if entry is not None and now < entry[3] and (
+                    entry[1] is None or now < entry[1]):
+                found[original] = entry[0]
+            else:
+                remote.append(key)
+        for start in range(0, len(remote), MAX_QUERY_KEYS):
+            chunk = remote[start:start + MAX_QUERY_KEYS]
+            rows = self.db.execute(
+                'SELECT key, value, expires, delta FROM cache_entries '
+                'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                .format(', '.join('?' * len(chunk))),
+                chunk + [now])
+            for key, value, expires, delta in rows:
+                value = pickle.loads(value)
+                self.local.set(key, (value, expires, delta,
+                                     now + self.local_timeout))
+                found[keys[key]] = value
+        return found
+
+    def _write(self, key, value, timeout, sql, *extra):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        with self._misses_lock:
+            started = self._misses.pop(key, None)
+        delta = now - started if started is not None else 0.0
+        cursor = self.db.execute(
+            sql, (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                  expires, delta) + extra)
+        if cursor.rowcount:
+            self.local.set(key, (value, expires, delta,
+                                 now + self.local_timeout))
+        self.db.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def _set(self, key, value, timeout):
+        self._write(
+            key, value, timeout,
+            'INSERT INTO cache_entries (key, value, expires, delta) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'delta = CASE WHEN excluded.delta > 0 THEN excluded.delta '
+            'ELSE cache_entries.delta END')
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set(self._key(key, version), value, timeout)
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {self._key(key, version): value for key, value in data.items()}
+        with self._transaction():
+            for key, value in keys.items():
+                self._set(key, value, timeout)
+        self._maybe_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._write(
+            self._key(key, version), value, timeout,
+            'INSERT INTO cache_entries (key, value, expires, delta) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'delta = excluded.delta '
+            'WHERE cache_entries.expires <= ?',
+            time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self.db.execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, now))
+        self.local.delete(key)
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction():
+            row = self.db.execute(
+                'SELECT value FROM cache_entries WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now)).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            self.db.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+        self.local.delete(key)
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self.db.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self.db.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        self.local.delete(key)
+
+    def delete_many(self, keys, version=None):
+        with self._transaction():
+            for key in keys:
+                self.delete(key, version)
+
+    def clear(self):
+        self.db.execute('DELETE FROM cache_entries')
+        self.db.execute('DELETE FROM cache_locks')
+        self.local.clear()
+        with self._misses_lock:
+            self._misses.clear()
+
+    def _maybe_cull(self):
+        if random.random() >= self.cull_probability:
+            return
+        now = time.time()
+        self.db.execute(
+            'DELETE FROM cache_entries WHERE expires < ?',
+            (now - self.stale_timeout,))
+        self.db.execute('DELETE FROM cache_locks WHERE expires <= ?', (now,))
+        count = self.db.execute(
+            'SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries:
+            self.db.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count - self._max_entries + self._max_entries
+                 // (self._cull_frequency or 1),))
@@ -0,0 +1,235 @@
+"""Чтение ленты с реплики базы.
+
+Реплика включается настройкой REPLICA_ENABLED. ReplicaMiddleware
+отправляет чтения представлений из REPLICA_VIEWS в базу
+REPLICA_DATABASE, запись всегда идёт в default. Реплика — копия файла
+SQLite основной базы: sync() переносит её через backup API целиком,
+поэтому каждая копия стоит времени, пропорционального размеру базы.
+После запроса с записью копию обновляет фоновый поток процесса, не
+чаще раза в REPLICA_SYNC_INTERVAL секунд; после migrate — сигнал
+post_migrate, после загрузки данных командами — команда sync_replica.
+
+Каждая копия оставляет в общем кэше отметку — время начала копии.
+Пока отметки нет, файла реплики нет или её схема отстаёт от основной
+базы, чтения идут в основную базу; файл и схема проверяются один раз
+на каждую отметку. Страница, версии которой (см. posts/versions.py)
+новее отметки, тоже читается из основной базы: иначе новый ETag ушёл
+бы со старым содержимым, и клиент получал бы 304 на устаревшую
+страницу.
+
+Реплика отстаёт от основной базы, поэтому после записи (новый пост,
+комментарий, подписка) чтения пользователя REPLICA_STICKY_SECONDS
+секунд идут в основную базу: срок хранится в cookie.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+_request = contextvars.ContextVar('replica_request', default=None)
+
+SYNCED_KEY = 'replica:synced'
+
+# Сессия или пользователь, которых ещё нет в копии, разлогинили бы
+# пользователя; это чтения по ключу, основной базе они дёшевы.
+PRIMARY_ONLY_APPS = {'auth', 'sessions'}
+
+
+class RequestState:
+    def __init__(self, sticky):
+        self.sticky = sticky
+        self.replica = False
+        self.synced = None
+        self.wrote = False
+
+
+def replica_enabled():
+    """Есть ли для чтения отдельная от default база."""
+    if (not settings.REPLICA_ENABLED
+            or settings.REPLICA_DATABASE not in settings.DATABASES):
+        return False
+    # В тестах реплика — зеркало той же базы.
+    return (connections[settings.REPLICA_DATABASE].settings_dict['NAME']
+            != connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+
+
+def last_migration(wrapper):
+    """id последней применённой миграции или None, если таблицы нет.
+
+    PRAGMA schema_version не годится: backup API меняет его в копии.
+    """
+    try:
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT MAX(id) FROM django_migrations')
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+def replica_current(source=None, target=None):
+    """Есть ли файл реплики и совпадает ли её схема со схемой основной
+    базы: после migrate без копии таблиц в реплике может не быть."""
+    source = source or connections[DEFAULT_DB_ALIAS]
+    target = target or connections[settings.REPLICA_DATABASE]
+    if target.settings_dict['NAME'] == source.settings_dict['NAME']:
+        return True
+    # Соединение с несуществующим файлом создало бы пустую базу.
+    if not os.path.exists(target.settings_dict['NAME']):
+        return False
+    return last_migration(target) == last_migration(source)
+
+
+_checked = (None, False)
+
+
+def replica_ready():
+    """Отметка последней копии или None, если реплику читать нельзя."""
+    global _checked
+    synced = cache.get(SYNCED_KEY)
+    if synced is None:
+        return None
+    if _checked[0] != synced:
+        _checked = (synced, replica_current())
+    return synced if _checked[1] else None
+
+
+def require_synced(version):
+    """Отправляет чтения запроса в основную базу, если реплика
+    скопирована раньше изменения с версией version."""
+    state = _request.get()
+    if state is not None and state.replica and version > state.synced:
+        state.replica = False
+
+
+def sync_after_migrate(sender, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and replica_enabled():
+        refresh()
+
+
+def sync(source=None, target=None):
+    """Копирует основную базу в файл реплики; False, если копировать
+    нечего."""
+    source = source or connections[DEFAULT_DB_ALIAS]
+    target = target or connections[settings.REPLICA_DATABASE]
+    if source.settings_dict['NAME'] == target.settings_dict['NAME']:
+        return False
+    source_conn = source.get_new_connection(source.get_connection_params())
+    try:
+        target_conn = target.get_new_connection(
+            target.get_connection_params())
+        try:
+            source_conn.backup(target_conn)
+        finally:
+            target_conn.close()
+    finally:
+        source_conn.close()
+    return True
+
+
+def refresh():
+    """sync() основной базы с отметкой в общем кэше: в копии есть всё,
+    что записано до начала копии."""
+    started = time.time()
+    if not sync():
+        return False
+    cache.set(SYNCED_KEY, started, None)
+    return True
+
+
+class Replicator:
+    """Фоновый поток процесса, обновляющий реплику после записей."""
+
+    def __init__(self):
+        self.pending = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def schedule(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='replica-sync', daemon=True)
+                self.thread.start()
+        self.pending.set()
+
+    def run(self):
+        while True:
+            self.pending.wait()
+            self.pending.clear()
+            try:
+                refresh()
+            except Exception:
+                logger.exception('Не удалось обновить реплику')
+            # Записи за время паузы попадут в следующую копию.
+            time.sleep(settings.REPLICA_SYNC_INTERVAL)
+
+
+replicator = Replicator()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if (state is None or not state.replica or state.wrote
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return DEFAULT_DB_ALIAS
+        # Открытая транзакция должна видеть собственные записи.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return settings.REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема попадает в реплику вместе с копией файла.
+        return db != settings.REPLICA_DATABASE
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(sticky=self.sticky_until(request) > time.time())
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        if state.wrote:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(settings.REPLICA_STICKY_COOKIE,
+                                int(time.time() + seconds),
+                                max_age=seconds, httponly=True)
+            if replica_enabled():
+                replicator.schedule()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request.get()
+        if (replica_enabled() and not state.sticky
+                and request.resolver_match.url_name in settings.REPLICA_VIEWS):
+            state.synced = replica_ready()
+            state.replica = state.synced is not None
+
+    @staticmethod
+    def sticky_until(request):
+        try:
+            return int(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE,
+                                           0))
+        except ValueError:
+            return 0
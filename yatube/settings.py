@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# manage.py test и pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -54,6 +61,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yatube.replica.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,11 +75,18 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Вне DEBUG скомпилированные шаблоны хранит в памяти процесса
+# кэширующий загрузчик, yatube/wsgi.py компилирует их при старте.
+TEMPLATE_CACHE = not DEBUG
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -80,6 +95,10 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'users.context_processors.year'
             ],
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATE_CACHE else TEMPLATE_LOADERS
+            ),
         },
     },
 ]
@@ -92,10 +111,40 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Секунды ожидания блокировки; PRAGMA в yatube/sqlite/base.py.
+            'timeout': 5,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Копия default для чтения ленты, см. yatube/replica.py.
+    'replica': {
+        'ENGINE': 'yatube.sqlite',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'timeout': 5,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
+DATABASE_ROUTERS = ['yatube.replica.ReplicaRouter']
+# Реплика копирует файл базы целиком после каждой записи: включать
+# её стоит для небольших баз с частыми чтениями ленты.
+REPLICA_ENABLED = False
+REPLICA_DATABASE = 'replica'
+REPLICA_VIEWS = ('index', 'group', 'profile', 'follow_index', 'post',
+                 'api_posts', 'api_group', 'api_profile', 'api_follow',
+                 'api_post', 'index_rss', 'index_atom', 'group_rss',
+                 'group_atom', 'profile_rss', 'profile_atom')
+REPLICA_STICKY_COOKIE = 'primary_until'
+REPLICA_STICKY_SECONDS = 5
+REPLICA_SYNC_INTERVAL = 1
 
 
 # Password validation
@@ -139,7 +188,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+if TESTING:
+    MEDIA_ROOT = tempfile.mkdtemp(prefix='yatube-media-')
+    atexit.register(shutil.rmtree, MEDIA_ROOT, True)
+else:
+    MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'posts.storage.ContentAddressedStorage'
+CONTENT_ADDRESSED_DIRS = ('posts',)
+CONTENT_RELEASE_GRACE = 60 * 10
 
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
@@ -148,9 +204,67 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 POSTS_ON_PAGE = 10
+CURSOR_PAGINATION = False
+
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL_LIMIT = 1000
+TIMELINE_BATCH_SIZE = 500
+FOLLOW_PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Тесты получают свой файл кэша во временном каталоге: cache.clear()
+# в тестах не стирает кэш сервера разработки.
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, True)
+else:
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.TwoTierCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'STALE_TIMEOUT': 300,
+            'LOCK_TIMEOUT': 30,
+        },
     }
 }
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 90
+POST_IMAGE_ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BatchedKVStore'
+THUMBNAIL_LOCAL_MAX_ENTRIES = 10000
+THUMBNAIL_LOCAL_TIMEOUT = 60
+POST_THUMBNAILS = (
+    ('480x120', {'crop': 'center', 'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+POST_IMAGE_WIDTHS = (360, 720, 1080, 1440)
+POST_IMAGE_FORMATS = {
+    'WEBP': {'quality': 80},
+}
+API_POST_THUMBNAIL = '960x339'
+# В тестах миниатюры строятся сразу: процесс пула читал бы настройки
+# заново и работал с базой и MEDIA_ROOT разработки.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+THUMBNAIL_JOB_TIMEOUT = 60 * 10
+
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_BASE_DELAY = 0.02
+WRITE_COALESCE = True
+WRITE_BATCH_SIZE = 50
+WRITE_BATCH_DELAY = 0.005
+WRITE_QUEUE_TIMEOUT = 30
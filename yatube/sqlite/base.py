@@ -0,0 +1,46 @@
+"""SQLite для одновременных читателей и писателей.
+
+WAL позволяет читать во время записи, busy_timeout заставляет ждать
+блокировку вместо ошибки «database is locked», а транзакции
+начинаются с BEGIN IMMEDIATE: транзакция, которая сначала читает, а
+потом пишет, иначе не может дождаться блокировки записи и сразу
+получает SQLITE_BUSY.
+
+PRAGMA из DEFAULT_PRAGMAS и OPTIONS['pragmas'] выполняются на каждом
+новом соединении, режим транзакций задаёт OPTIONS['transaction_mode'].
+Соединения переиспользуются между запросами через CONN_MAX_AGE.
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В WAL запись не теряет целостность и без fsync на каждый коммит.
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Отрицательное значение — размер в КиБ: 64 МБ на соединение.
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+OWN_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in OWN_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        options = self.settings_dict['OPTIONS']
+        pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode',
+                                                 'IMMEDIATE')
+        self.cursor().execute(f'BEGIN {mode or ""}')
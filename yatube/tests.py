@@ -0,0 +1,315 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.template import engines
+from django.test import Client, SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from posts.models import Follow, Post, User
+from yatube import replica, warmup
+from yatube.cache import TwoTierCache
+from yatube.sqlite.base import DatabaseWrapper
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def worker(self, **options):
+        """Отдельный экземпляр кэша, как в другом процессе"""
+        return TwoTierCache(self.location, {'OPTIONS': options})
+
+    def test_workers_share_values(self):
+        first, second = self.worker(), self.worker()
+        first.set('key', {'a': 1}, 60)
+        self.assertEqual(second.get('key'), {'a': 1})
+        self.assertTrue(second.add('other', 1, 60))
+        self.assertFalse(first.add('other', 2, 60))
+        first.delete('key')
+        second.local.clear()
+        self.assertIsNone(second.get('key'))
+
+    def test_single_flight_serves_stale_copy(self):
+        """После истечения пересчитывает один обработчик,
+        остальные получают устаревшую копию"""
+
+        first, second = self.worker(), self.worker()
+        first.set('fragment', 'старый', 60)
+        later = time.time() + 61
+        with mock.patch('yatube.cache.time.time', return_value=later):
+            self.assertIsNone(first.get('fragment'))
+            self.assertEqual(second.get('fragment'), 'старый')
+            first.set('fragment', 'новый', 60)
+            second.local.clear()
+            self.assertEqual(second.get('fragment'), 'новый')
+
+    def test_early_recomputation(self):
+        cache = self.worker(BETA=1.0)
+        cache.set('fragment', 'значение', 60)
+        cache.db.execute('UPDATE cache_entries SET delta = 1000')
+        cache.local.clear()
+        with mock.patch('yatube.cache.random.random', return_value=0.5):
+            self.assertIsNone(cache.get('fragment'))
+
+    def test_local_lru_is_bounded(self):
+        cache = self.worker(LOCAL_MAX_ENTRIES=2)
+        for num in range(5):
+            cache.set(f'key{num}', num, 60)
+        self.assertEqual(len(cache.local.entries), 2)
+        self.assertEqual(cache.get('key0'), 0)
+
+    def test_incr_and_clear(self):
+        cache = self.worker()
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter', 2), 3)
+        cache.clear()
+        self.assertIsNone(cache.get('counter'))
+
+    def test_get_many_reads_in_one_query(self):
+        first, second = self.worker(), self.worker()
+        first.set_many({'a': 1, 'b': 2}, 60)
+        first.set('old', 3, -1)
+        self.assertEqual(second.get_many(['a', 'b', 'old', 'missing']),
+                         {'a': 1, 'b': 2})
+        self.assertEqual(len(second.local.entries), 2)
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, 'db.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wrapper(self, **options):
+        settings_dict = dict(connection.settings_dict, NAME=self.name,
+                             OPTIONS=options)
+        return DatabaseWrapper(settings_dict, alias='sqlite_test')
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_on_new_connection(self):
+        wrapper = self.wrapper(pragmas={'cache_size': -1000})
+        try:
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+            self.assertEqual(self.pragma(wrapper, 'temp_store'), 2)
+            self.assertEqual(self.pragma(wrapper, 'cache_size'), -1000)
+        finally:
+            wrapper.close()
+
+    def test_transactions_take_write_lock_at_start(self):
+        """Транзакция начинается с BEGIN IMMEDIATE: второй писатель
+        ждёт ещё до первой записи"""
+
+        wrapper = self.wrapper(transaction_mode='IMMEDIATE')
+        other = sqlite3.connect(self.name, timeout=0, isolation_level=None)
+        try:
+            wrapper.ensure_connection()
+            wrapper._start_transaction_under_autocommit()
+            with self.assertRaisesMessage(sqlite3.OperationalError,
+                                          'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+            wrapper.connection.rollback()
+            other.execute('BEGIN IMMEDIATE')
+            other.rollback()
+        finally:
+            other.close()
+            wrapper.close()
+
+
+class ReplicaSyncTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wrapper(self, name):
+        settings_dict = dict(connection.settings_dict, OPTIONS={},
+                             NAME=os.path.join(self.directory, name))
+        return DatabaseWrapper(settings_dict, alias=name)
+
+    def test_sync_copies_primary_file(self):
+        """Реплика получает схему и данные, открытое соединение
+        реплики видит следующую копию"""
+
+        primary, copy = self.wrapper('primary'), self.wrapper('replica')
+        try:
+            with primary.cursor() as cursor:
+                cursor.execute('CREATE TABLE notes (text TEXT)')
+                cursor.execute("INSERT INTO notes VALUES ('первая')")
+            self.assertTrue(replica.sync(primary, copy))
+            with copy.cursor() as cursor:
+                cursor.execute('SELECT text FROM notes')
+                self.assertEqual(cursor.fetchall(), [('первая',)])
+            with primary.cursor() as cursor:
+                cursor.execute("INSERT INTO notes VALUES ('вторая')")
+            replica.sync(primary, copy)
+            with copy.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM notes')
+                self.assertEqual(cursor.fetchone()[0], 2)
+        finally:
+            primary.close()
+            copy.close()
+
+    def test_replica_current_checks_file_and_schema(self):
+        """Реплика без файла или со старой схемой не используется"""
+
+        primary, copy = self.wrapper('primary'), self.wrapper('replica')
+        try:
+            with primary.cursor() as cursor:
+                cursor.execute('CREATE TABLE django_migrations '
+                               '(id INTEGER PRIMARY KEY, name TEXT)')
+                cursor.execute("INSERT INTO django_migrations (name) "
+                               "VALUES ('0001_initial')")
+            self.assertFalse(replica.replica_current(primary, copy))
+            self.assertFalse(os.path.exists(copy.settings_dict['NAME']))
+            replica.sync(primary, copy)
+            self.assertTrue(replica.replica_current(primary, copy))
+            with primary.cursor() as cursor:
+                cursor.execute("INSERT INTO django_migrations (name) "
+                               "VALUES ('0002_tags')")
+            self.assertFalse(replica.replica_current(primary, copy))
+        finally:
+            primary.close()
+            copy.close()
+
+    def test_migrate_syncs_replica(self):
+        with mock.patch('yatube.replica.replica_enabled',
+                        return_value=True), \
+                mock.patch('yatube.replica.refresh') as refresh:
+            replica.sync_after_migrate(sender=None, using='replica')
+            refresh.assert_not_called()
+            replica.sync_after_migrate(sender=None, using='default')
+        refresh.assert_called_once_with()
+
+    def test_replica_is_opt_in(self):
+        with override_settings(REPLICA_ENABLED=False):
+            self.assertFalse(replica.replica_enabled())
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    # В тестах реплика — зеркало default (TEST['MIRROR']).
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        # Зеркало не считается отдельной базой, но маршрутизацию
+        # запросов на нём видно.
+        enabled = mock.patch('yatube.replica.replica_enabled',
+                             return_value=True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+        self.user = User.objects.create_user(username='reader')
+        Post.objects.create(text='запись', author=self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+        replica._checked = (None, False)
+        # Версии страниц появляются при первом чтении; копия новее их.
+        for url in self.feed_urls():
+            self.client.get(url)
+        self.mark_synced()
+
+    def feed_urls(self):
+        return (reverse('index'), reverse('follow_index'),
+                reverse('profile', kwargs={'username': 'reader'}))
+
+    def mark_synced(self):
+        cache.set(replica.SYNCED_KEY, time.time(), None)
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_reads_go_to_replica(self):
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                self.assertGreater(self.replica_queries(url), 0)
+        self.assertEqual(self.replica_queries(reverse('new_post')), 0)
+
+    def test_stale_replica_falls_back_to_primary(self):
+        with mock.patch('yatube.replica.replica_current',
+                        return_value=False):
+            self.assertEqual(self.replica_queries(reverse('index')), 0)
+
+    def test_replica_is_checked_once_per_sync(self):
+        with mock.patch('yatube.replica.replica_current',
+                        return_value=True) as current:
+            for _ in range(3):
+                self.assertGreater(self.replica_queries(reverse('index')), 0)
+            self.assertEqual(current.call_count, 1)
+            self.mark_synced()
+            self.replica_queries(reverse('index'))
+            self.assertEqual(current.call_count, 2)
+
+    def test_unsynced_replica_is_not_read(self):
+        cache.delete(replica.SYNCED_KEY)
+        self.assertEqual(self.replica_queries(reverse('index')), 0)
+
+    def test_changes_newer_than_sync_are_read_from_primary(self):
+        """Страница, изменённая после копии, читается из основной базы:
+        новый ETag не уходит со старым содержимым"""
+
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        self.mark_synced()
+        Post.objects.create(text='после копии', author=author)
+        for url in (reverse('index'), reverse('follow_index'),
+                    reverse('profile', kwargs={'username': 'author'})):
+            with self.subTest(url=url):
+                self.assertEqual(self.replica_queries(url), 0)
+        self.assertGreater(self.replica_queries(
+            reverse('profile', kwargs={'username': 'reader'})), 0)
+        self.mark_synced()
+        self.assertGreater(self.replica_queries(reverse('index')), 0)
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи чтения пользователя идут в основную базу,
+        пока не истечёт срок"""
+
+        with mock.patch.object(replica.replicator, 'schedule') as schedule:
+            response = self.client.post(reverse('new_post'),
+                                        {'text': 'новая'})
+        schedule.assert_called_once_with()
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.replica_queries(reverse('index')), 0)
+        # Копия с новой записью.
+        self.mark_synced()
+        later = time.time() + settings.REPLICA_STICKY_SECONDS + 1
+        with mock.patch('yatube.replica.time.time', return_value=later):
+            self.assertGreater(self.replica_queries(reverse('index')), 0)
+
+
+class TemplateWarmUpTests(SimpleTestCase):
+    def test_warm_up_compiles_templates_once(self):
+        """После warm_up() шаблоны берутся из памяти без чтения файлов"""
+
+        template = settings.TEMPLATES[0]
+        options = dict(template['OPTIONS'], loaders=warmup.loaders(True))
+        with override_settings(TEMPLATES=[dict(template, OPTIONS=options)]):
+            self.assertGreaterEqual(warmup.warm_up(), 20)
+            with mock.patch(
+                    'django.template.loaders.filesystem.Loader.get_contents',
+                    side_effect=AssertionError('шаблон прочитан с диска')):
+                for name in ('index.html', 'includes/incl_post_block.html',
+                             'signup.html'):
+                    with self.subTest(template=name):
+                        engines['django'].get_template(name)
@@ -23,6 +23,7 @@ handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
 urlpatterns = [
+    path("api/v1/", include("posts.api_urls")),
     path("", include("posts.urls")),
     path("admin/admin/", admin.site.urls),
     path("auth/", include("users.urls")),
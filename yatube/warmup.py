@@ -0,0 +1,58 @@
+"""Компиляция шаблонов при старте процесса.
+
+С кэширующим загрузчиком шаблон читается и разбирается один раз на
+процесс, но этот раз приходится на первый запрос каждой страницы.
+warm_up() загружает заранее все шаблоны проекта: каталоги DIRS и
+templates/ приложений, лежащих в BASE_DIR.
+"""
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+
+logger = logging.getLogger(__name__)
+
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+
+def loaders(cached):
+    """Загрузчики шаблонов с кэшем в памяти процесса или без него."""
+    if cached:
+        return [(CACHED_LOADER, list(settings.TEMPLATE_LOADERS))]
+    return list(settings.TEMPLATE_LOADERS)
+
+
+def template_dirs(engine):
+    dirs = list(engine.engine.dirs)
+    for app in apps.get_app_configs():
+        directory = os.path.join(app.path, 'templates')
+        if app.path.startswith(settings.BASE_DIR) and os.path.isdir(
+                directory):
+            dirs.append(directory)
+    return dirs
+
+
+def template_names(engine):
+    names = set()
+    for directory in template_dirs(engine):
+        for root, _, files in os.walk(directory):
+            names.update(
+                os.path.relpath(os.path.join(root, name), directory)
+                for name in files if name.endswith(('.html', '.txt')))
+    return sorted(names)
+
+
+def warm_up():
+    """Компилирует шаблоны проекта, возвращает число загруженных."""
+    engine = engines['django']
+    loaded = 0
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError:
+            logger.exception('Шаблон %s не компилируется', name)
+            continue
+        loaded += 1
+    return loaded
@@ -0,0 +1,22 @@
+"""Пул процессов для тяжёлой работы вне обработки запроса.
+
+Процессы запускаются через spawn: после fork дочерний процесс унаследовал
+бы соединения с базой и потоки родителя. Модуль не импортирует модели,
+потому что инициализатор пула загружается до django.setup().
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def setup_django():
+    import django
+
+    django.setup()
+
+
+def process_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_django,
+    )